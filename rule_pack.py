@@ -0,0 +1,173 @@
+# 계약서 위험 조항 규칙 팩: 규칙 팩 파일을 읽어 매처까지 컴파일하고, 파일이 바뀌면 재시작 없이 교체합니다.
+# shellter_gradio.py와 shelter_gradio.py가 함께 사용하므로 앱 전체(스레드 풀, HTTP 클라이언트 등)를 불러오지 않도록 분리했습니다.
+import os
+import re
+import json
+import threading
+import time
+import types
+from collections import deque
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# 규칙 기반 분석 규칙 팩 (파일이 바뀌면 재시작 없이 교체됩니다)
+RULE_PACK_PATH = os.getenv("RULE_PACK_PATH", "./rules/contract_rule_pack.json")
+RULE_PACK_CHECK_INTERVAL = float(os.getenv("RULE_PACK_CHECK_INTERVAL", "2"))
+
+# 규칙 팩 파일이 없을 때 사용하는 기본 규칙 (rules/contract_rule_pack.json과 동일)
+# "patterns"에 정규식 조항 패턴을 추가하면 키워드와 함께 검사됩니다. (패턴은 팩을 불러올 때 한 번만 컴파일)
+DEFAULT_RULE_PACK = {
+    "version": "builtin",
+    "threshold": 0.5,
+    "legacy_threshold": 0.3,
+    "penalties": {"CRITICAL": 40, "WARNING": 20, "ADVISORY": 10},
+    "categories": {
+        "보증금_반환": {"keywords": ["보증금", "반환", "즉시", "계약종료"], "risk": "CRITICAL"},
+        "권리관계_유지": {"keywords": ["권리관계", "익일", "근저당", "대항력"], "risk": "CRITICAL"},
+        "전세자금대출": {"keywords": ["대출", "불가", "무효", "전세자금"], "risk": "WARNING"},
+        "수선_의무": {"keywords": ["수선", "하자", "파손", "수리"], "risk": "ADVISORY"},
+        "특약사항": {"keywords": ["특약", "기타사항", "추가조건"], "risk": "ADVISORY"}
+    }
+}
+
+def compile_rule_matcher(categories: dict) -> dict:
+    """
+    모든 카테고리 키워드를 Aho-Corasick 오토마톤 하나로 컴파일해 계약서를 한 번만 훑도록 합니다.
+    조항 정규식("patterns")은 서로 겹치는 일치를 놓치지 않도록 패턴마다 따로 컴파일해 둡니다.
+    """
+    goto, fail, output = [{}], [0], [()]
+    patterns = []  # 패턴 id → (카테고리, 키워드)
+    for cat_name, info in categories.items():
+        for keyword in info.get("keywords", []):
+            state = 0
+            for ch in keyword:
+                if ch not in goto[state]:
+                    goto.append({})
+                    fail.append(0)
+                    output.append(())
+                    goto[state][ch] = len(goto) - 1
+                state = goto[state][ch]
+            output[state] = output[state] + (len(patterns),)
+            patterns.append((cat_name, keyword))
+
+    # 너비 우선으로 실패 링크를 만들고, 실패 링크 쪽 출력도 합쳐 겹치는 키워드를 모두 잡습니다.
+    queue = deque(goto[0].values())
+    while queue:
+        state = queue.popleft()
+        for ch, next_state in goto[state].items():
+            queue.append(next_state)
+            f = fail[state]
+            while f and ch not in goto[f]:
+                f = fail[f]
+            fallback = goto[f].get(ch, 0)
+            fail[next_state] = fallback if fallback != next_state else 0
+            output[next_state] = output[next_state] + output[fail[next_state]]
+
+    regex_patterns = tuple(  # (카테고리, 패턴, 컴파일된 정규식)
+        (cat_name, pattern, re.compile(pattern))
+        for cat_name, info in categories.items()
+        for pattern in info.get("patterns", [])
+    )
+
+    return {
+        "goto": tuple(goto),
+        "fail": tuple(fail),
+        "output": tuple(output),
+        "patterns": tuple(patterns),
+        "regex_patterns": regex_patterns,
+    }
+
+def scan_rule_matcher(matcher: dict, text: str, base_offset: int = 0, keyword_hits: dict | None = None) -> dict:
+    """
+    텍스트를 한 번 훑어 {카테고리: {키워드/패턴: [(시작, 끝), ...]}} 형태로 일치 위치를 누적합니다.
+    base_offset은 페이지 단위로 나누어 호출할 때 전체 텍스트 기준 위치를 맞추기 위한 값입니다.
+    """
+    if keyword_hits is None:
+        keyword_hits = {}
+    goto, fail, output, patterns = matcher["goto"], matcher["fail"], matcher["output"], matcher["patterns"]
+
+    state = 0
+    for pos, ch in enumerate(text):
+        while state and ch not in goto[state]:
+            state = fail[state]
+        state = goto[state].get(ch, 0)
+        for pattern_id in output[state]:
+            cat_name, keyword = patterns[pattern_id]
+            end = base_offset + pos + 1
+            keyword_hits.setdefault(cat_name, {}).setdefault(keyword, []).append((end - len(keyword), end))
+
+    for cat_name, pattern, regex in matcher["regex_patterns"]:
+        for match in regex.finditer(text):
+            keyword_hits.setdefault(cat_name, {}).setdefault(pattern, []).append(
+                (base_offset + match.start(), base_offset + match.end())
+            )
+    return keyword_hits
+
+def compile_rule_pack(raw_pack: dict) -> types.MappingProxyType:
+    """
+    규칙 팩(dict)을 검증한 뒤 매처까지 미리 컴파일한 읽기 전용 객체로 만듭니다.
+    요청 처리 중에는 이 객체를 읽기만 하므로 매처를 다시 만들 일이 없습니다.
+    """
+    penalties = {str(risk): int(points) for risk, points in raw_pack.get("penalties", {}).items()}
+    categories = {}
+    for cat_name, info in raw_pack.get("categories", {}).items():
+        risk = info.get("risk")
+        if risk not in penalties:
+            raise ValueError(f"'{cat_name}' 카테고리의 위험도 '{risk}'에 대한 감점(penalties)이 없습니다.")
+        keywords = tuple(str(kw) for kw in info.get("keywords", []) if str(kw))
+        patterns = tuple(str(p) for p in info.get("patterns", []) if str(p))
+        if not keywords and not patterns:
+            raise ValueError(f"'{cat_name}' 카테고리에 키워드나 패턴이 없습니다.")
+        categories[cat_name] = types.MappingProxyType({"keywords": keywords, "patterns": patterns, "risk": risk})
+    if not categories:
+        raise ValueError("규칙 팩에 카테고리가 없습니다.")
+
+    return types.MappingProxyType({
+        "version": str(raw_pack.get("version", "unknown")),
+        "threshold": float(raw_pack.get("threshold", 0.5)),
+        "legacy_threshold": float(raw_pack.get("legacy_threshold", 0.3)),
+        "penalties": types.MappingProxyType(penalties),
+        "categories": types.MappingProxyType(categories),
+        "matcher": compile_rule_matcher(categories),
+    })
+
+ACTIVE_RULE_PACK = compile_rule_pack(DEFAULT_RULE_PACK)
+RULE_PACK_STATE = {"mtime": None, "checked_at": 0.0}
+_RULE_PACK_LOCK = threading.Lock()
+
+def get_active_rule_pack() -> types.MappingProxyType:
+    """
+    현재 규칙 팩을 반환합니다. RULE_PACK_CHECK_INTERVAL마다 파일 mtime을 확인하고,
+    바뀌었으면 새 팩을 컴파일해 참조를 한 번에 교체합니다. 잘못된 파일이면 기존 팩을 유지합니다.
+    """
+    global ACTIVE_RULE_PACK
+    now = time.monotonic()
+    if now - RULE_PACK_STATE["checked_at"] < RULE_PACK_CHECK_INTERVAL:
+        return ACTIVE_RULE_PACK
+
+    with _RULE_PACK_LOCK:
+        if now - RULE_PACK_STATE["checked_at"] < RULE_PACK_CHECK_INTERVAL:
+            return ACTIVE_RULE_PACK
+        RULE_PACK_STATE["checked_at"] = now
+        try:
+            mtime = os.stat(RULE_PACK_PATH).st_mtime
+        except FileNotFoundError:
+            return ACTIVE_RULE_PACK
+        if mtime == RULE_PACK_STATE["mtime"]:
+            return ACTIVE_RULE_PACK
+
+        try:
+            with open(RULE_PACK_PATH, 'r', encoding='utf-8') as f:
+                new_pack = compile_rule_pack(json.load(f))
+            ACTIVE_RULE_PACK = new_pack
+            print(f"✅ 규칙 팩 v{new_pack['version']} 적용 ({len(new_pack['categories'])}개 카테고리, {RULE_PACK_PATH})")
+        except Exception as e:
+            print(f"⚠️ 규칙 팩 로드 실패, 기존 규칙 v{ACTIVE_RULE_PACK['version']}을 유지합니다: {e}")
+        RULE_PACK_STATE["mtime"] = mtime
+        return ACTIVE_RULE_PACK
+
+def scan_rule_keywords(text: str, keyword_hits: dict | None = None, base_offset: int = 0, rule_pack=None) -> dict:
+    """텍스트에서 카테고리별 키워드 일치 위치를 keyword_hits에 누적합니다. 페이지 단위로 반복 호출할 수 있습니다."""
+    rule_pack = rule_pack or get_active_rule_pack()
+    return scan_rule_matcher(rule_pack["matcher"], text, base_offset, keyword_hits)
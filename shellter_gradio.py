@@ -8,6 +8,18 @@ import re
 import base64
 import subprocess
 import tempfile
+import hashlib
+import httpx
+import math
+import pickle
+import random
+import threading
+import unicodedata
+import time
+from array import array
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from html import escape as html_escape
 from pathlib import Path
 from dotenv import load_dotenv
 import io
@@ -15,6 +27,7 @@ from PIL import Image, ImageDraw, ImageFont
 import textwrap
 from datetime import datetime
 from tqdm import tqdm 
+from rule_pack import get_active_rule_pack, scan_rule_keywords
 
 from langchain_upstage import (
     UpstageDocumentParseLoader,
@@ -22,12 +35,12 @@ from langchain_upstage import (
     ChatUpstage,
     UpstageGroundednessCheck,
 )
-from operator import itemgetter
+from operator import mul
 from langchain_community.vectorstores import Chroma
 from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import RunnablePassthrough
 from langchain_core.runnables import RunnableLambda
 from langchain_core.output_parsers import StrOutputParser
 
@@ -38,21 +51,34 @@ def docs_to_text(docs):
     except Exception:
         return str(docs)
 
-# Groundedness 컨텍스트 빌더: 검색 컨텍스트 + 계약/질문 원문 결합
-def build_grounded_context_for_contract(contract_text: str) -> str:
+# 검색 유틸: 검색 실패 시 빈 목록을 반환
+# query_vector를 넘기면 질의를 다시 임베딩하지 않고 그 벡터로 검색합니다 (상담 답변 캐시 조회 때 만든 벡터 재사용)
+def retrieve_documents(query: str, query_vector=None) -> list:
     try:
-        retrieved = RETRIEVER.invoke(contract_text) if RETRIEVER else []
-    except Exception:
-        retrieved = []
-    retrieved_text = docs_to_text(retrieved)
+        request = query if query_vector is None else {"query": query, "vector": query_vector}
+        docs = RETRIEVER.invoke(request) if RETRIEVER else []
+    except Exception as e:
+        print(f"⚠️ 참고 자료 검색 실패: {e}")
+        docs = []
+    return docs
+
+def merge_documents(*doc_lists) -> list:
+    """여러 검색 결과를 순서대로 합치고 내용이 같은 문서는 한 번만 남깁니다."""
+    merged, seen = [], set()
+    for docs in doc_lists:
+        for doc in docs:
+            if doc.page_content not in seen:
+                seen.add(doc.page_content)
+                merged.append(doc)
+    return merged
+
+# Groundedness 컨텍스트 빌더: 답변 생성에 쓴 검색 결과(docs) + 계약/질문 원문 결합 (검색을 다시 하지 않음)
+def build_grounded_context_for_contract(contract_text: str, docs: list) -> str:
+    retrieved_text = docs_to_text(docs)
     return f"[참고 자료]\n{retrieved_text}\n\n[계약서]\n{contract_text}"
 
-def build_grounded_context_for_question(question_text: str) -> str:
-    try:
-        retrieved = RETRIEVER.invoke(question_text) if RETRIEVER else []
-    except Exception:
-        retrieved = []
-    retrieved_text = docs_to_text(retrieved)
+def build_grounded_context_for_question(question_text: str, docs: list) -> str:
+    retrieved_text = docs_to_text(docs)
     return f"[참고 자료]\n{retrieved_text}\n\n[질문]\n{question_text}"
 
 # 선택 의존성 (HTML -> PNG 변환용)
@@ -75,6 +101,29 @@ except Exception:
     except Exception:
         MARKDOWN_AVAILABLE = False
 
+# 선택 의존성 (PDF/DOCX 내장 텍스트 레이어 추출용)
+PYPDF_AVAILABLE = False
+try:
+    from pypdf import PdfReader, PdfWriter
+    PYPDF_AVAILABLE = True
+except Exception:
+    PYPDF_AVAILABLE = False
+
+DOCX_AVAILABLE = False
+try:
+    import docx
+    DOCX_AVAILABLE = True
+except Exception:
+    DOCX_AVAILABLE = False
+
+# 선택 의존성 (검색용 임베딩 행렬 스냅샷)
+NUMPY_AVAILABLE = False
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except Exception:
+    NUMPY_AVAILABLE = False
+
 # 환경 변수
 try:
     if load_dotenv():
@@ -99,6 +148,82 @@ LAW_PARSED_PATH = "./data/주택임대차보호법(법률)(제19356호)_parsed.j
 DEFAULTER_LIST_PATH = "./data/상습채무불이행자.CSV"
 CHROMA_DB_PATH = "./chroma_db_real_estate_gradio"
 
+# 캐시 경로 및 용량 설정
+CACHE_DIR = Path("./cache")
+OCR_CACHE_DIR = CACHE_DIR / "ocr"
+OCR_CACHE_MAX_BYTES = int(os.getenv("OCR_CACHE_MAX_MB", "512")) * 1024 * 1024
+EMBEDDING_CACHE_DIR = CACHE_DIR / "embeddings"
+EMBEDDING_CACHE_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_MB", "256")) * 1024 * 1024
+EMBEDDING_CACHE_MEMORY_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MEMORY_ENTRIES", "2048"))
+
+# 지식 베이스 증분 구축 (원천 파일 해시 기록, 임베딩 묶음 크기, 분할 설정 버전)
+KB_MANIFEST_KEY = "knowledge_base_manifest"
+KB_EMBED_BATCH_SIZE = int(os.getenv("KB_EMBED_BATCH_SIZE", "64"))
+KB_CHUNKING_VERSION = "article-1000-addenda"
+KB_CHUNK_MAX_CHARS = 1000
+
+# 하이브리드 검색 (BM25 + 벡터, RRF 결합 후 로컬 재정렬)
+RETRIEVER_K = int(os.getenv("RETRIEVER_K", "3"))
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+HYBRID_RERANK = os.getenv("HYBRID_RERANK", "1") != "0"
+RRF_K = 60
+BM25_K1, BM25_B = 1.5, 0.75
+RETRIEVAL_SNAPSHOT_DIR = CACHE_DIR / "retrieval_snapshot"
+
+# 내장 텍스트 레이어 품질 기준 (미달 페이지만 OCR로 보냅니다)
+NATIVE_TEXT_MIN_CHARS = int(os.getenv("NATIVE_TEXT_MIN_CHARS", "80"))
+NATIVE_TEXT_MIN_HANGUL_RATIO = float(os.getenv("NATIVE_TEXT_MIN_HANGUL_RATIO", "0.3"))
+
+# 페이지 병렬 OCR 설정 (동시 작업 수, 작업당 페이지 수)
+OCR_MAX_WORKERS = int(os.getenv("OCR_MAX_WORKERS", "4"))
+OCR_PAGES_PER_BATCH = int(os.getenv("OCR_PAGES_PER_BATCH", "2"))
+OCR_EXECUTOR = ThreadPoolExecutor(max_workers=OCR_MAX_WORKERS, thread_name_prefix="ocr")
+
+# 상습 채무불이행자 명단 인덱스 (CSV mtime이 바뀌면 다시 만듭니다)
+DEFAULTER_INDEX_PATH = CACHE_DIR / "defaulter_index.pkl"
+FUZZY_NAME_MAX_DISTANCE = int(os.getenv("FUZZY_NAME_MAX_DISTANCE", "1"))  # 자모 단위 편집 거리 (성이 같은 이름만 비교)
+
+# LLM 호출 동시 실행 수와 분당 호출 한도 (긴 계약서의 청크 병렬 분석 등에 사용)
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "60"))
+LLM_EXECUTOR = ThreadPoolExecutor(max_workers=LLM_MAX_CONCURRENCY, thread_name_prefix="llm")
+
+# 긴 텍스트 번역: 청크별 재시도 횟수, 다음 청크에 문맥으로 넘길 앞 청크 끝부분 길이
+TRANSLATION_CHUNK_RETRIES = int(os.getenv("TRANSLATION_CHUNK_RETRIES", "2"))
+TRANSLATION_OVERLAP_CHARS = int(os.getenv("TRANSLATION_OVERLAP_CHARS", "300"))
+
+# 번역 메모리: 마크다운 블록 단위 번역 결과를 (원문 해시, 대상 언어, 모델) 키로 디스크에 보관하고, 새 블록만 묶음 크기 이하로 나눠 번역합니다
+TRANSLATION_MEMORY_DIR = CACHE_DIR / "translation_memory"
+TRANSLATION_MEMORY_MAX_BYTES = int(os.getenv("TRANSLATION_MEMORY_MAX_MB", "64")) * 1024 * 1024
+TRANSLATION_BATCH_CHARS = int(os.getenv("TRANSLATION_BATCH_CHARS", "6000"))
+
+# 분석 보고서 선제 번역: 분석이 끝나면 자주 쓰는 언어(배포 기본값 + 브라우저 언어)로 미리 번역해 둡니다
+PRETRANSLATE_LANGUAGES = [code.strip().upper() for code in os.getenv("PRETRANSLATE_LANGUAGES", "").split(",") if code.strip()]
+PRETRANSLATE_BROWSER_LOCALE = os.getenv("PRETRANSLATE_BROWSER_LOCALE", "1") != "0"
+PRETRANSLATE_MAX_WORKERS = int(os.getenv("PRETRANSLATE_MAX_WORKERS", "1"))
+PRETRANSLATE_MAX_SESSIONS = 64
+PRETRANSLATE_EXECUTOR = ThreadPoolExecutor(max_workers=PRETRANSLATE_MAX_WORKERS, thread_name_prefix="pretranslate")
+# 모든 ChatUpstage 클라이언트가 공유하는 keep-alive HTTP 연결 풀 (요청마다 TLS 연결을 새로 맺지 않음)
+# 채팅·분석 스트리밍은 응답이 끝날 때까지 연결을 잡고 있으므로, 동시 사용자 수를 감안해 넉넉하게 잡습니다.
+UPSTAGE_MAX_CONNECTIONS = int(os.getenv("UPSTAGE_MAX_CONNECTIONS", "100"))
+UPSTAGE_HTTP_CLIENT = httpx.Client(
+    limits=httpx.Limits(max_connections=UPSTAGE_MAX_CONNECTIONS, max_keepalive_connections=max(1, UPSTAGE_MAX_CONNECTIONS // 4), keepalive_expiry=60),
+    timeout=httpx.Timeout(180.0, connect=10.0),
+)
+
+# 응답 후 백그라운드 Groundedness Check 설정 (표본 비율 0~1, 결과 기록 파일)
+GROUNDEDNESS_SAMPLE_RATE = float(os.getenv("GROUNDEDNESS_SAMPLE_RATE", "1.0"))
+GROUNDEDNESS_MAX_WORKERS = int(os.getenv("GROUNDEDNESS_MAX_WORKERS", "2"))
+GROUNDEDNESS_LOG_PATH = CACHE_DIR / "groundedness.jsonl"
+GROUNDEDNESS_LOG_MAX_BYTES = int(os.getenv("GROUNDEDNESS_LOG_MAX_MB", "16")) * 1024 * 1024
+GROUNDEDNESS_SUMMARY_EVERY = 20  # 검사 N건마다 누적 통계를 터미널에 출력
+GROUNDEDNESS_EXECUTOR = ThreadPoolExecutor(max_workers=GROUNDEDNESS_MAX_WORKERS, thread_name_prefix="groundedness")
+
+# 상담 답변 의미 캐시 (질문 임베딩 코사인 유사도 기준, 지식 베이스가 다시 구축되면 비웁니다)
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_HOURS", "24")) * 3600
+ANSWER_CACHE_MAX_ENTRIES = max(1, int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "500")))
+
 # 다국어 폰트 자동 다운로드 로직, TTF만으로 정확한 링크로 수정 진행.
 FONTS_DIR = Path("./fonts")
 FONT_URLS = {
@@ -202,12 +327,8 @@ def setup_fonts():
     print("✅ 모든 폰트 설정이 완료되었습니다.")
 
 
-def build_ai_brain_if_needed():
-    """AI의 지식 베이스(Vector DB)를 구축합니다. 이미 존재하면 건너뜁니다."""
-    if os.path.exists(CHROMA_DB_PATH):
-        print(f"✅ Vector DB가 이미 존재합니다. ({CHROMA_DB_PATH})")
-        return
-    print(f"✨ AI의 지식 베이스(Vector DB)를 새로 구축합니다...")
+def load_knowledge_base_documents() -> list:
+    """지식 베이스 원천 데이터(EasyLaw Q&A, 주택임대차보호법, 특약 조항)를 Document 목록으로 읽습니다."""
     all_documents = []
     
     # EasyLaw Q&A 데이터 로드
@@ -248,19 +369,193 @@ def build_ai_brain_if_needed():
         print(f"  - 특약 조항 데이터 로드 완료 ({clauses_count}개)")
     except FileNotFoundError:
         print(f"  [경고] '{SPECIAL_CLAUSES_PATH}' 파일을 찾을 수 없습니다.")
-    
+    return all_documents
+
+# 법령 조문 제목 패턴: "제3조(대항력 등)", "제3조의2(보증금의 회수)" (본문 속 "제3조제1항" 같은 인용은 제목 괄호가 없어 제외)
+LAW_ARTICLE_HEADING_RE = re.compile(r'(?:^|(?<=\s))제\s*(\d+)\s*조(?:\s*의\s*(\d+))?\s*\(([^()\n]{1,40})\)')
+# 질문 속 조문 번호 참조: "제3조", "제3조의2", "제 8 조" ('3조원' 같은 금액과 헷갈리지 않도록 '제'가 있어야 함)
+LAW_ARTICLE_REF_RE = re.compile(r'제\s*(\d+)\s*조(?:\s*의\s*(\d+))?')
+# 질문에 나온 법령 이름 (주택임대차보호법이 아닌 법을 물으면 조문 색인을 쓰지 않음)
+LAW_NAME_RE = re.compile(r'[가-힣]*(?:법률|법|시행령|시행규칙)(?![가-힣])')
+NON_LAW_WORDS = ("방법", "불법", "위법", "합법", "편법", "적법", "탈법", "문법", "기법", "수법", "용법", "비법", "요법")
+# 부칙 시작: '부칙 <제19356호, ...>' (부칙의 제1조 등이 본문 조문을 덮어쓰지 않도록 본문과 분리)
+LAW_ADDENDA_RE = re.compile(r'(?:^|\n)[ \t]*부\s*칙[ \t]*(?=<|\(|\n|$)')
+LAW_PARAGRAPH_RE = re.compile(r'(?=[①-⑳])')
+
+def law_article_key(number, sub_number=None) -> str:
+    """조문 번호를 색인 키로 만듭니다. (예: (3, 2) → '제3조의2')"""
+    return f"제{int(number)}조" + (f"의{int(sub_number)}" if sub_number else "")
+
+def split_law_sections(law_text: str) -> tuple:
+    """법령 전문을 (첫 조문 앞 머리말, 본문 조문 목록, 부칙)으로 나눕니다. 조문 목록은 [(조문 키, 조문 제목, 조문 전체 텍스트)]입니다."""
+    law_text = law_text or ''
+    first = LAW_ARTICLE_HEADING_RE.search(law_text)
+    if not first:
+        return law_text.strip(), [], ""
+    addenda = LAW_ADDENDA_RE.search(law_text, first.end())
+    body_end = addenda.start() if addenda else len(law_text)
+    matches = list(LAW_ARTICLE_HEADING_RE.finditer(law_text, first.start(), body_end))
+    articles = []
+    for i, m in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else body_end
+        articles.append((law_article_key(m.group(1), m.group(2)), m.group(3).strip(), law_text[m.start():end].strip()))
+    return law_text[:first.start()].strip(), articles, law_text[body_end:].strip()
+
+def split_law_into_articles(law_text: str) -> list:
+    """법령 본문을 조문 단위로 나눕니다. [(조문 키, 조문 제목, 조문 전체 텍스트)] 순서대로 반환합니다. (머리말·부칙 제외)"""
+    return split_law_sections(law_text)[1]
+
+def pack_text_pieces(pieces: list, max_chars: int) -> list:
+    """조각을 순서대로 이어 붙이되 max_chars를 넘지 않게 묶습니다. 한 조각이 너무 길면 그대로 하나의 묶음이 됩니다."""
+    packed, current = [], ""
+    for piece in pieces:
+        piece = piece.strip()
+        if not piece:
+            continue
+        if current and len(current) + len(piece) + 1 > max_chars:
+            packed.append(current)
+            current = piece
+        else:
+            current = f"{current}\n{piece}" if current else piece
+    if current:
+        packed.append(current)
+    return packed
+
+def chunk_law_document(doc) -> list:
+    """
+    법령 문서를 조문 단위 청크로 나눕니다. 긴 조문은 항(①②…) 경계에서 나누고 각 청크 앞에 조문 제목을 붙입니다.
+    첫 조문 앞 머리말과 부칙은 버리거나 마지막 조문에 합치지 않고 각각 별도 청크로 만듭니다.
+    조문을 하나도 찾지 못하면 빈 목록을 반환해 일반 분할기로 나누게 합니다.
+    """
+    preamble, articles, addenda = split_law_sections(doc.page_content)
+    if not articles:
+        return []
+
+    def section_chunks(section_key, section_text):
+        return [
+            Document(page_content=part, metadata={**doc.metadata, "article": section_key, "article_title": section_key})
+            for part in pack_text_pieces(section_text.split('\n'), KB_CHUNK_MAX_CHARS)
+        ]
+
+    chunks = section_chunks("머리말", preamble)
+    for article_key, article_title, article_text in articles:
+        heading = f"{article_key}({article_title})"
+        if len(article_text) <= KB_CHUNK_MAX_CHARS:
+            parts = [article_text]
+        else:
+            body = article_text[article_text.index(')') + 1:]
+            parts = [f"{heading} {part}" for part in pack_text_pieces(LAW_PARAGRAPH_RE.split(body), KB_CHUNK_MAX_CHARS - len(heading))]
+        for part in parts:
+            chunks.append(Document(
+                page_content=part,
+                metadata={**doc.metadata, "article": article_key, "article_title": article_title}
+            ))
+    chunks.extend(section_chunks("부칙", addenda))
+    return chunks
+
+def chunk_qa_document(doc) -> list:
+    """EasyLaw Q&A 문서는 질문·답변 한 쌍을 한 청크로 두고, 긴 답변만 문단 단위로 나누어 각 청크 앞에 질문을 붙입니다."""
+    if len(doc.page_content) <= KB_CHUNK_MAX_CHARS:
+        return [doc]
+    question, _, answer = doc.page_content.partition("\n사례 답변: ")
+    pieces = pack_text_pieces(re.split(r'\n+', answer), KB_CHUNK_MAX_CHARS - len(question))
+    return [
+        Document(page_content=f"{question}\n사례 답변: {piece}", metadata={**doc.metadata, "part": i})
+        for i, piece in enumerate(pieces, 1)
+    ]
+
+def knowledge_base_source_fingerprint() -> dict:
+    """지식 베이스 원천 파일별 SHA-256과 분할 설정을 반환합니다. 이전 구축 때와 같으면 변경 사항이 없습니다."""
+    fingerprint = {"chunking": KB_CHUNKING_VERSION}
+    for path in (EASYLAW_QA_PATH, LAW_PARSED_PATH, SPECIAL_CLAUSES_PATH):
+        fingerprint[path] = sha256_of_file(path) if os.path.exists(path) else None
+    return fingerprint
+
+def split_knowledge_base_documents(all_documents: list) -> list:
+    """
+    문서를 검색 단위 청크로 나누고, 내용 해시를 청크 ID로 붙입니다. 같은 내용의 청크는 하나만 남깁니다.
+    법령은 조문 단위, Q&A는 질문·답변 단위로 나누고, 그 밖의 문서나 조문을 찾지 못한 법령은 일반 분할기를 사용합니다.
+    """
+    fallback_splitter = RecursiveCharacterTextSplitter(chunk_size=KB_CHUNK_MAX_CHARS, chunk_overlap=100)
+    split_docs = []
+    for doc in all_documents:
+        source = doc.metadata.get("source")
+        structured = chunk_law_document(doc) if source == "housing_lease_law" else chunk_qa_document(doc) if source == "easylaw_qa" else None
+        split_docs.extend(structured or fallback_splitter.split_documents([doc]))
+    chunks = {}
+    for doc in split_docs:
+        chunk_id = sha256_of_text(f"{doc.metadata.get('source', '')}\n{doc.page_content}")[:32]
+        doc.metadata["chunk_id"] = chunk_id
+        chunks.setdefault(chunk_id, doc)
+    return list(chunks.values())
+
+def embed_knowledge_base_batch(embeddings, texts: list):
+    """청크 묶음 하나를 임베딩합니다. (임베딩 캐시에 저장되어 이후 Chroma 추가 시 API를 다시 호출하지 않음)"""
+    for attempt in range(2):
+        acquire_llm_rate_slot()
+        try:
+            return embeddings.embed_documents(texts)
+        except Exception as e:
+            if attempt:
+                raise
+            print(f"⚠️ 임베딩 묶음 실패, 재시도합니다: {e}")
+
+def build_ai_brain_if_needed():
+    """
+    AI의 지식 베이스(Vector DB)를 증분 구축합니다.
+    원천 파일이 이전 구축 때와 같으면 건너뛰고, 바뀌었으면 내용 해시 기준으로 새 청크만 임베딩해 추가하고 사라진 청크는 삭제합니다.
+    묶음 단위로 Chroma에 바로 저장하므로, 중간에 중단되어도 다음 실행에서 남은 청크부터 이어서 진행합니다.
+    사라진 청크 삭제와 매니페스트 기록은 모든 새 청크가 저장된 뒤에만 합니다.
+    """
+    fingerprint = knowledge_base_source_fingerprint()
+    if os.path.exists(CHROMA_DB_PATH) and disk_cache_read_json(CACHE_DIR, KB_MANIFEST_KEY) == fingerprint:
+        print(f"✅ Vector DB가 최신 상태입니다. ({CHROMA_DB_PATH})")
+        return
+
+    print(f"✨ AI의 지식 베이스(Vector DB)를 갱신합니다...")
+    all_documents = load_knowledge_base_documents()
     if not all_documents:
         print("🔴 DB를 구축할 데이터가 없습니다. RAG 기능이 정상 동작하지 않을 수 있습니다.")
         return
-    
-    print("  - 텍스트 분할 및 임베딩 진행 중... (시간이 걸릴 수 있습니다)")
-    split_docs = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100).split_documents(all_documents)
-    Chroma.from_documents(
-        documents=split_docs,
-        embedding=UpstageEmbeddings(model="solar-embedding-1-large"),
-        persist_directory=CHROMA_DB_PATH
-    )
-    print(f"🎉 Vector DB 구축 완료! ({CHROMA_DB_PATH})")
+
+    chunks = split_knowledge_base_documents(all_documents)
+    embeddings = CachedUpstageEmbeddings(model="solar-embedding-1-large")
+    vectorstore = Chroma(persist_directory=CHROMA_DB_PATH, embedding_function=embeddings)
+    existing_ids = set(vectorstore.get(include=[])["ids"])
+    wanted = {doc.metadata["chunk_id"]: doc for doc in chunks}
+
+    stale_ids = [chunk_id for chunk_id in existing_ids if chunk_id not in wanted]
+    new_docs = [doc for chunk_id, doc in wanted.items() if chunk_id not in existing_ids]
+    print(f"  - 전체 청크 {len(wanted)}개: 유지 {len(wanted) - len(new_docs)}개, 추가 {len(new_docs)}개, 삭제 {len(stale_ids)}개")
+
+    if new_docs:
+        print("  - 새 청크 임베딩 진행 중...")
+        batches = [new_docs[i:i + KB_EMBED_BATCH_SIZE] for i in range(0, len(new_docs), KB_EMBED_BATCH_SIZE)]
+        futures = [
+            LLM_EXECUTOR.submit(embed_knowledge_base_batch, embeddings, [doc.page_content for doc in batch])
+            for batch in batches
+        ]
+        try:
+            # 임베딩이 끝난 묶음부터 순서대로 저장합니다. (저장된 묶음이 곧 체크포인트)
+            for batch, future in tqdm(zip(batches, futures), total=len(batches), desc="  임베딩"):
+                future.result()
+                vectorstore.add_documents(batch, ids=[doc.metadata["chunk_id"] for doc in batch])
+        except Exception as e:
+            for future in futures:
+                future.cancel()
+            print(f"❌ 지식 베이스 갱신 중단: {e} (다음 실행 시 남은 청크부터 이어서 진행합니다)")
+            return
+
+    # 새 청크가 모두 저장된 뒤에만 사라진 청크를 지웁니다. (갱신이 실패해도 기존 DB로 계속 검색 가능)
+    if stale_ids:
+        for start in range(0, len(stale_ids), KB_EMBED_BATCH_SIZE):
+            vectorstore.delete(ids=stale_ids[start:start + KB_EMBED_BATCH_SIZE])
+
+    if new_docs or stale_ids:
+        # 새 지식 베이스 기준으로 답변해야 하므로 이전 상담 답변 캐시는 버립니다.
+        invalidate_answer_cache()
+    disk_cache_write_json(CACHE_DIR, KB_MANIFEST_KEY, fingerprint, max_bytes=float("inf"))
+    print(f"🎉 Vector DB 갱신 완료! ({CHROMA_DB_PATH})")
 
 # ### MODIFIED FUNCTION ###: 로컬에 다운로드된 폰트를 직접 사용하는 방식으로 변경
 def get_multilingual_font(size=16, bold=False, lang_code='KO'):
@@ -614,48 +909,548 @@ def draw_text_with_emoji(draw, text, position, main_font, emoji_font, align='lef
             print(f"⚠️ 폴백 렌더링도 실패: {e2}")
 
 
-def extract_text_from_file(file_path: str) -> tuple[str, str]:
-    if not file_path or not os.path.exists(file_path):
-        return "", "파일을 찾을 수 없습니다."
+# 디스크 캐시 공통 유틸: 내용 해시를 키로 파일 하나씩 저장하고, mtime 기준 LRU로 용량을 제한합니다.
+def sha256_of_file(file_path: str, block_size: int = 1024 * 1024) -> str:
+    """파일 바이트 전체의 SHA-256 해시를 계산합니다."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
 
+def sha256_of_text(text: str) -> str:
+    """문자열의 SHA-256 해시를 계산합니다."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def disk_cache_read_json(cache_dir: Path, key: str):
+    """캐시 항목을 읽습니다. 적중 시 mtime을 갱신해 LRU 순서를 유지합니다."""
+    path = Path(cache_dir) / f"{key}.json"
     try:
-        # Upstage 라이브러리가 이미지와 문서를 처리합니다. JPG도 여기에 포함됩니다.
-        pages = UpstageDocumentParseLoader(file_path, ocr="force").load()
-        extracted_text = "\n\n".join([p.page_content for p in pages if p.page_content])
-        
-        if not extracted_text.strip():
-            return "", "파일에서 텍스트를 추출할 수 없었습니다. 내용이 비어있거나 인식이 어렵습니다."
-            
-        return extracted_text, "성공"
+        with open(path, 'r', encoding='utf-8') as f:
+            payload = json.load(f)
+        os.utime(path, None)
+        return payload
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"⚠️ 캐시 항목 읽기 실패 ({path.name}): {e}")
+        return None
+
+def disk_cache_write_json(cache_dir: Path, key: str, payload, max_bytes: int) -> int:
+    """캐시 항목을 원자적으로 저장하고, 용량 초과 시 오래된 항목을 정리합니다. 삭제한 항목 수를 반환합니다."""
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(payload, f, ensure_ascii=False)
+        os.replace(tmp_path, cache_dir / f"{key}.json")
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return evict_disk_cache(cache_dir, max_bytes)
+
+def disk_cache_read_bytes(cache_dir: Path, key: str, suffix: str):
+    """바이너리 캐시 항목을 읽습니다. 적중 시 mtime을 갱신해 LRU 순서를 유지합니다."""
+    path = Path(cache_dir) / f"{key}{suffix}"
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+        os.utime(path, None)
+        return data
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"⚠️ 캐시 항목 읽기 실패 ({path.name}): {e}")
+        return None
+
+def disk_cache_write_bytes(cache_dir: Path, key: str, suffix: str, data: bytes):
+    """바이너리 캐시 항목을 원자적으로 저장합니다. 용량 정리는 호출하는 쪽에서 evict_disk_cache로 합니다."""
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, cache_dir / f"{key}{suffix}")
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def evict_disk_cache(cache_dir: Path, max_bytes: int) -> int:
+    """캐시 폴더 총 용량이 max_bytes를 넘으면 가장 오래 사용되지 않은 항목부터 삭제합니다."""
+    entries = []
+    total_size = 0
+    for entry in os.scandir(cache_dir):
+        if entry.is_file() and not entry.name.endswith(".tmp"):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total_size += stat.st_size
+    if total_size <= max_bytes:
+        return 0
+
+    evicted = 0
+    for _, size, path in sorted(entries):
+        if total_size <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total_size -= size
+            evicted += 1
+        except FileNotFoundError:
+            pass
+    return evicted
+
+# OCR 결과 캐시 (파일 바이트 SHA-256 → 페이지별 텍스트)
+OCR_CACHE_STATS = {"hits": 0, "misses": 0, "evictions": 0}
+_OCR_CACHE_LOCK = threading.Lock()
+
+def load_cached_ocr_pages(file_hash: str):
+    """캐시된 OCR 페이지 목록을 반환합니다. 없으면 None."""
+    payload = disk_cache_read_json(OCR_CACHE_DIR, file_hash)
+    with _OCR_CACHE_LOCK:
+        if payload is None:
+            OCR_CACHE_STATS["misses"] += 1
+        else:
+            OCR_CACHE_STATS["hits"] += 1
+        stats = dict(OCR_CACHE_STATS)
+    if payload is None:
+        print(f"  [OCR 캐시] 미적중 (hits={stats['hits']}, misses={stats['misses']})")
+        return None
+    print(f"  [OCR 캐시] 적중! OCR 호출을 건너뜁니다. (hits={stats['hits']}, misses={stats['misses']})")
+    return payload.get("pages", [])
+
+def store_cached_ocr_pages(file_hash: str, pages: list) -> None:
+    """OCR 페이지 목록을 캐시에 저장합니다. 실패해도 분석은 계속 진행합니다."""
+    try:
+        with _OCR_CACHE_LOCK:
+            evicted = disk_cache_write_json(
+                OCR_CACHE_DIR, file_hash,
+                {"pages": pages, "created": datetime.now().isoformat()},
+                OCR_CACHE_MAX_BYTES
+            )
+            OCR_CACHE_STATS["evictions"] += evicted
+        if evicted:
+            print(f"  [OCR 캐시] 용량 초과로 오래된 항목 {evicted}개를 정리했습니다.")
+    except Exception as e:
+        print(f"⚠️ OCR 캐시 저장 실패: {e}")
+
+def is_native_text_usable(page_text: str) -> bool:
+    """내장 텍스트 레이어가 OCR 없이 쓸 만한지 글자 밀도와 한글 비율로 판단합니다."""
+    compact = re.sub(r'\s+', '', page_text or '')
+    if len(compact) < NATIVE_TEXT_MIN_CHARS:
+        return False
+
+    # 폰트 매핑이 깨진 PDF는 대체 문자(�)나 낱자모(ㄱ-ㅣ)가 섞여 나옵니다.
+    broken_chars = compact.count('\ufffd') + len(re.findall(r'[\u3131-\u318E]', compact))
+    if broken_chars / len(compact) > 0.05:
+        return False
+
+    letters = re.findall(r'[가-힣A-Za-z]', compact)
+    if not letters:
+        return False
+    hangul_count = sum(1 for ch in letters if '가' <= ch <= '힣')
+    return hangul_count / len(letters) >= NATIVE_TEXT_MIN_HANGUL_RATIO
+
+def extract_native_pages(file_path: str):
+    """
+    OCR 없이 파일에 내장된 텍스트를 페이지 단위로 추출합니다.
+    지원하지 않는 형식이거나 라이브러리가 없으면 None을 반환합니다.
+    """
+    file_extension = Path(file_path).suffix.lower()
+    try:
+        if file_extension in ['.txt', '.md']:
+            for encoding in ['utf-8-sig', 'cp949']:
+                try:
+                    with open(file_path, 'r', encoding=encoding) as f:
+                        return [f.read()]
+                except UnicodeDecodeError:
+                    continue
+            return None
+        if file_extension == '.pdf' and PYPDF_AVAILABLE:
+            reader = PdfReader(file_path)
+            return [(page.extract_text() or "") for page in reader.pages]
+        if file_extension == '.docx' and DOCX_AVAILABLE:
+            document = docx.Document(file_path)
+            lines = [p.text for p in document.paragraphs]
+            for table in document.tables:
+                for row in table.rows:
+                    lines.append(" | ".join(cell.text.strip() for cell in row.cells))
+            return ["\n".join(lines)]
+    except Exception as e:
+        print(f"⚠️ 내장 텍스트 추출 실패, OCR로 진행합니다: {e}")
+    return None
+
+def ocr_pdf_pages(file_path: str, page_indices: list) -> dict:
+    """지정한 PDF 페이지만 잘라낸 임시 PDF를 OCR하여 {페이지 인덱스: 텍스트}를 반환합니다."""
+    reader = PdfReader(file_path)
+    writer = PdfWriter()
+    for idx in page_indices:
+        writer.add_page(reader.pages[idx])
+
+    fd, subset_path = tempfile.mkstemp(suffix=".pdf")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            writer.write(f)
+        docs = UpstageDocumentParseLoader(subset_path, ocr="force", split="page").load()
+    finally:
+        os.remove(subset_path)
+
+    if len(docs) != len(page_indices):
+        raise ValueError(f"OCR 페이지 수 불일치 (요청 {len(page_indices)}, 결과 {len(docs)})")
+    return {idx: doc.page_content or "" for idx, doc in zip(page_indices, docs)}
+
+def ocr_pdf_pages_with_retry(file_path: str, page_indices: list) -> dict:
+    """ocr_pdf_pages를 실행하고, 일시적 오류에 대비해 한 번 더 시도합니다."""
+    try:
+        return ocr_pdf_pages(file_path, page_indices)
+    except Exception as e:
+        print(f"⚠️ 페이지 {[i + 1 for i in page_indices]} OCR 실패, 재시도합니다: {e}")
+        return ocr_pdf_pages(file_path, page_indices)
+
+def ocr_whole_document_pages(file_path: str, total_pages: int):
+    """페이지 단위 OCR이 실패했을 때 문서 전체를 페이지별로 OCR합니다. 실패하거나 페이지 수가 맞지 않으면 None을 반환합니다."""
+    try:
+        pages = UpstageDocumentParseLoader(file_path, ocr="force", split="page").load()
+        texts = [p.page_content for p in pages]
+        return texts if len(texts) == total_pages else None
     except Exception as e:
-        # 오류 발생 시 더 구체적인 메시지 반환
-        error_message = f"파일 처리 중 오류가 발생했습니다. 파일이 손상되었거나 지원하지 않는 형식일 수 있습니다.\n(서버 오류: {str(e)})"
-        print(f"❌ 텍스트 추출 실패: {error_message}")
-        return "", error_message
+        print(f"❌ 전체 문서 OCR도 실패했습니다: {e}")
+        return None
+
+def iter_parsed_pages(file_path: str, notices: list | None = None):
+    """
+    내장 텍스트 레이어를 먼저 사용하고, 품질 검사를 통과하지 못한 페이지만 Upstage OCR로 처리합니다.
+    OCR 대상 페이지는 OCR_PAGES_PER_BATCH 단위로 나누어 OCR_EXECUTOR에서 동시에 처리하며,
+    결과는 (페이지 인덱스, 전체 페이지 수, 텍스트)로 페이지 순서대로 내보냅니다.
+    이미지·HWP 등 텍스트 레이어가 없는 형식은 기존처럼 전체를 OCR합니다.
+    OCR 묶음이 실패하면 전체 문서 OCR로, 그것도 실패하면 내장 텍스트로 대신하고 notices에 사용자 안내 문구를 남깁니다.
+    """
+    file_extension = Path(file_path).suffix.lower()
+    native_pages = extract_native_pages(file_path)
+
+    if native_pages is not None and file_extension in ['.txt', '.md']:
+        print("  [텍스트 추출] 텍스트 파일을 직접 읽었습니다. (OCR 생략)")
+        for i, text in enumerate(native_pages):
+            yield i, len(native_pages), text
+        return
+
+    if native_pages is not None and file_extension == '.pdf':
+        total_pages = len(native_pages)
+        ocr_indices = [i for i, text in enumerate(native_pages) if not is_native_text_usable(text)]
+        print(f"  [텍스트 추출] PDF {total_pages}페이지 중 내장 텍스트 사용 {total_pages - len(ocr_indices)}페이지, OCR {len(ocr_indices)}페이지")
+
+        futures = {}
+        for start in range(0, len(ocr_indices), OCR_PAGES_PER_BATCH):
+            batch = ocr_indices[start:start + OCR_PAGES_PER_BATCH]
+            future = OCR_EXECUTOR.submit(ocr_pdf_pages_with_retry, file_path, batch)
+            for idx in batch:
+                futures[idx] = future
+        fallback_pages, failed_pages = None, []
+        try:
+            for i, text in enumerate(native_pages):
+                if i in futures:
+                    try:
+                        text = futures[i].result().get(i, "")
+                    except Exception as e:
+                        if not failed_pages:
+                            print(f"⚠️ 페이지 단위 OCR 실패, 전체 문서 OCR로 전환합니다: {e}")
+                            for future in set(futures.values()):
+                                future.cancel()
+                            fallback_pages = ocr_whole_document_pages(file_path, total_pages)
+                        failed_pages.append(i + 1)
+                        text = fallback_pages[i] if fallback_pages else text
+                yield i, total_pages, text
+            if failed_pages and notices is not None:
+                source = "전체 문서 OCR 결과" if fallback_pages else "문서의 내장 텍스트"
+                notices.append(f"⚠️ [텍스트 추출] {', '.join(map(str, failed_pages))}페이지 OCR에 실패해 {source}로 대신했습니다. 해당 페이지의 분석은 부정확할 수 있습니다.")
+        finally:
+            # 소비자가 중간에 멈추면 아직 시작하지 않은 OCR 작업은 취소합니다.
+            for future in set(futures.values()):
+                future.cancel()
+        return
+
+    if native_pages is not None and all(is_native_text_usable(text) for text in native_pages):
+        print("  [텍스트 추출] 문서의 내장 텍스트를 사용합니다. (OCR 생략)")
+        for i, text in enumerate(native_pages):
+            yield i, len(native_pages), text
+        return
+
+    # Upstage 라이브러리가 이미지와 문서를 처리합니다. JPG도 여기에 포함됩니다.
+    pages = UpstageDocumentParseLoader(file_path, ocr="force").load()
+    page_texts = [p.page_content for p in pages if p.page_content]
+    for i, text in enumerate(page_texts):
+        yield i, len(page_texts), text
+
+def iter_document_pages(file_path: str, notices: list | None = None):
+    """
+    문서 텍스트를 페이지 순서대로 하나씩 내보내는 제너레이터입니다. (page_index, total_pages, text)
+    앞 페이지가 준비되는 즉시 내보내므로, 뒤 페이지를 OCR하는 동안에도 규칙 기반 분석을 시작할 수 있습니다.
+    동일한 파일(바이트 기준)은 캐시된 결과를 바로 내보내고, 전체 페이지를 문제없이 끝까지 받은 경우에만 캐시에 저장합니다.
+    OCR 실패로 대체 텍스트를 쓴 경우 notices에 안내 문구가 추가됩니다.
+    """
+    try:
+        file_hash = sha256_of_file(file_path)
+    except OSError as e:
+        print(f"⚠️ 파일 해시 계산 실패, 캐시 없이 진행합니다: {e}")
+        file_hash = None
+
+    cached_pages = load_cached_ocr_pages(file_hash) if file_hash else None
+    if cached_pages is not None:
+        for i, text in enumerate(cached_pages):
+            yield i, len(cached_pages), text
+        return
+
+    collected, page_notices = [], []
+    for page_index, total_pages, text in iter_parsed_pages(file_path, page_notices):
+        collected.append(text)
+        yield page_index, total_pages, text
+    if notices is not None:
+        notices.extend(page_notices)
+
+    page_texts = [text for text in collected if text]
+    if file_hash and not page_notices and "".join(page_texts).strip():
+        store_cached_ocr_pages(file_hash, page_texts)
+
+# 상습 채무불이행자 명단 인덱스: 정규화된 이름 → 명단 항목 목록 (O(1) 조회)
+DEFAULTER_INDEX_FORMAT = 2
+DEFAULTER_INDEX = None
+_DEFAULTER_INDEX_LOCK = threading.Lock()
+
+def normalize_person_name(name: str) -> str:
+    """이름 비교용 정규화: 유니코드 NFC 정규화 후 법인 표기((주), 주식회사 등)와 모든 공백을 제거합니다."""
+    name = unicodedata.normalize('NFC', name or '')
+    name = re.sub(r'\(\s*[주유]\s*\)|㈜|주식회사|유한회사', '', name)
+    return re.sub(r'\s+', '', name)
+
+def decompose_hangul(text: str) -> str:
+    """한글 음절을 초성·중성·종성 자모로 분해합니다. (예: '홍' → ㅎ+ㅗ+ㅇ) 한글이 아닌 문자는 그대로 둡니다."""
+    jamo = []
+    for ch in text:
+        code = ord(ch) - 0xAC00
+        if 0 <= code < 11172:
+            jamo.append(chr(0x1100 + code // 588))
+            jamo.append(chr(0x1161 + (code % 588) // 28))
+            if code % 28:
+                jamo.append(chr(0x11A7 + code % 28))
+        else:
+            jamo.append(ch)
+    return ''.join(jamo)
+
+def jamo_bigrams(jamo: str) -> set:
+    """자모 문자열의 바이그램 집합 (앞뒤 경계 표시 포함)."""
+    padded = f"^{jamo}$"
+    return {padded[i:i + 2] for i in range(len(padded) - 1)}
+
+def bounded_edit_distance(a: str, b: str, max_distance: int) -> int:
+    """편집 거리를 계산하되 max_distance를 넘으면 바로 max_distance + 1을 반환합니다."""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+    return previous[-1]
+
+def build_defaulter_index(csv_path: str, source_mtime: float, source_size: int) -> dict:
+    """명단 CSV를 한 번 읽어 이름/이름+출생연도 해시맵과 유사 이름 검색용 자모 바이그램 역색인을 만듭니다."""
+    by_name, by_name_birth = {}, {}
+    name_jamo, jamo_postings = {}, {}
+    row_count = 0
+    with open(csv_path, 'r', encoding='utf-8-sig') as f:
+        reader = csv.DictReader(f)
+        fields = reader.fieldnames or []
+        birth_field = next((c for c in fields if '생년' in c or '출생' in c), None)
+        address_field = next((c for c in fields if '주소' in c or '소재지' in c), None)
+        for row in reader:
+            name = normalize_person_name(row.get('성명', ''))
+            if not name:
+                continue
+            birth_match = re.search(r'(19|20)\d{2}', row.get(birth_field, '') or '') if birth_field else None
+            entry = (
+                name,
+                birth_match.group(0) if birth_match else None,
+                (row.get(address_field, '') or '').strip() if address_field else '',
+            )
+            if name not in by_name:
+                jamo = decompose_hangul(name)
+                name_jamo[name] = jamo
+                for gram in jamo_bigrams(jamo):
+                    jamo_postings.setdefault(gram, []).append(name)
+            by_name.setdefault(name, []).append(entry)
+            if entry[1]:
+                by_name_birth.setdefault((name, entry[1]), []).append(entry)
+            row_count += 1
+    return {
+        "format": DEFAULTER_INDEX_FORMAT,
+        "source_mtime": source_mtime,
+        "source_size": source_size,
+        "row_count": row_count,
+        "by_name": by_name,
+        "by_name_birth": by_name_birth,
+        "name_jamo": name_jamo,
+        "jamo_postings": jamo_postings,
+    }
+
+def get_defaulter_index() -> dict:
+    """
+    명단 인덱스를 반환합니다. CSV의 mtime/크기가 바뀌었을 때만 다시 만들고(핫 리로드),
+    만든 인덱스는 피클로 저장해 재시작 시 CSV 파싱 없이 바로 불러옵니다.
+    명단 파일이 없으면 FileNotFoundError가 발생합니다.
+    """
+    global DEFAULTER_INDEX
+    stat = os.stat(DEFAULTER_LIST_PATH)
+    index = DEFAULTER_INDEX
+    if index and index["source_mtime"] == stat.st_mtime and index["source_size"] == stat.st_size:
+        return index
+
+    with _DEFAULTER_INDEX_LOCK:
+        index = DEFAULTER_INDEX
+        if index and index["source_mtime"] == stat.st_mtime and index["source_size"] == stat.st_size:
+            return index
+
+        index = None
+        try:
+            with open(DEFAULTER_INDEX_PATH, 'rb') as f:
+                snapshot = pickle.load(f)
+            if (snapshot.get("format") == DEFAULTER_INDEX_FORMAT
+                    and snapshot.get("source_mtime") == stat.st_mtime
+                    and snapshot.get("source_size") == stat.st_size):
+                index = snapshot
+                print(f"✅ 상습 채무불이행자 인덱스를 스냅샷에서 불러왔습니다. ({index['row_count']}명)")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"⚠️ 명단 인덱스 스냅샷 로드 실패, CSV에서 다시 만듭니다: {e}")
 
-def perform_rule_based_analysis(contract_text: str) -> dict:
+        if index is None:
+            index = build_defaulter_index(DEFAULTER_LIST_PATH, stat.st_mtime, stat.st_size)
+            try:
+                DEFAULTER_INDEX_PATH.parent.mkdir(parents=True, exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(dir=DEFAULTER_INDEX_PATH.parent, suffix=".tmp")
+                with os.fdopen(fd, 'wb') as f:
+                    pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, DEFAULTER_INDEX_PATH)
+            except Exception as e:
+                print(f"⚠️ 명단 인덱스 스냅샷 저장 실패: {e}")
+            print(f"✅ 상습 채무불이행자 인덱스 구축 완료 ({index['row_count']}명)")
+
+        # 참조를 한 번에 교체하므로 조회 중인 요청은 이전 인덱스를 끝까지 안전하게 사용합니다.
+        DEFAULTER_INDEX = index
+        return index
+
+def lookup_defaulters(name: str, birth_year: str | None = None, address: str | None = None) -> list:
+    """정규화된 이름(선택적으로 출생연도·주소)으로 명단 항목을 조회합니다. 항목은 (이름, 출생연도, 주소) 튜플입니다."""
+    index = get_defaulter_index()
+    normalized = normalize_person_name(name)
+    if birth_year:
+        matches = index["by_name_birth"].get((normalized, str(birth_year)), [])
+    else:
+        matches = index["by_name"].get(normalized, [])
+    if address:
+        address_key = normalize_person_name(address)
+        matches = [m for m in matches if not m[2] or address_key in normalize_person_name(m[2])]
+    return matches
+
+def find_similar_defaulters(name: str, max_distance: int = FUZZY_NAME_MAX_DISTANCE) -> list:
+    """
+    성(첫 글자)이 같고 자모 단위 편집 거리가 max_distance 이하인 명단 이름을 찾습니다. [(명단 이름, 거리), ...]
+    2~3음절 이름은 자모 몇 개만 달라도 흔한 다른 이름이 되므로 성이 다른 후보는 비교하지 않습니다.
+    자모 바이그램 역색인으로 후보를 먼저 좁힌 뒤(q-gram 개수 필터) 후보에 대해서만 편집 거리를 계산합니다.
+    """
+    index = get_defaulter_index()
+    normalized = normalize_person_name(name)
+    if not normalized:
+        return []
+    jamo = decompose_hangul(normalized)
+    grams = jamo_bigrams(jamo)
+
+    shared_counts = {}
+    for gram in grams:
+        for candidate in index["jamo_postings"].get(gram, ()):
+            shared_counts[candidate] = shared_counts.get(candidate, 0) + 1
+
+    # 편집 1회는 바이그램을 최대 2개 바꾸므로, 이보다 적게 겹치는 후보는 계산할 필요가 없습니다.
+    min_shared = max(1, len(grams) - 2 * max_distance)
+    matches = []
+    for candidate, shared in shared_counts.items():
+        if shared < min_shared or candidate == normalized or candidate[0] != normalized[0]:
+            continue
+        distance = bounded_edit_distance(jamo, index["name_jamo"][candidate], max_distance)
+        if distance <= max_distance:
+            matches.append((candidate, distance))
+    return sorted(matches, key=lambda m: (m[1], m[0]))
+
+def split_candidate_names(text: str) -> list:
+    """'홍길동, 김철수' 처럼 여러 임대인이 함께 적힌 문자열을 정규화된 이름 목록으로 나눕니다."""
+    names = []
+    for part in re.split(r'[,/·、;]|\s및\s|\s외\s', text or ''):
+        name = normalize_person_name(part)
+        if re.fullmatch(r'[가-힣A-Za-z0-9]{2,30}', name) and name not in names:
+            names.append(name)
+    return names
+
+def screen_landlord_names(names: list) -> dict:
+    """
+    임대인 후보 이름 여러 개를 한 번에 명단과 대조합니다.
+    반환값: {이름: {"exact": [명단 항목...], "similar": [(명단 이름, 자모 거리), ...]}}
+    """
+    results = {}
+    for name in names:
+        exact = lookup_defaulters(name)
+        results[name] = {
+            "exact": exact,
+            "similar": [] if exact else find_similar_defaulters(name),
+        }
+    return results
+
+def build_clause_highlights(contract_text: str, keyword_hits: dict, window: int = 30, limit: int = 3) -> dict:
+    """일치 위치 주변 문맥을 잘라 리포트 하이라이트용 (앞 문맥, 일치 문구, 뒤 문맥) 목록을 만듭니다."""
+    highlights = {}
+    for cat_name, hits in keyword_hits.items():
+        spans = sorted(span for spans in hits.values() for span in spans)
+        snippets, last_end = [], -1
+        for start, end in spans:
+            if start < last_end:
+                continue  # 바로 앞 스니펫과 겹치는 위치는 건너뜁니다.
+            before = contract_text[max(0, start - window):start].replace("\n", " ")
+            after = contract_text[end:end + window].replace("\n", " ")
+            snippets.append((before, contract_text[start:end], after))
+            last_end = end + window
+            if len(snippets) >= limit:
+                break
+        if snippets:
+            highlights[cat_name] = snippets
+    return highlights
+
+def perform_rule_based_analysis(contract_text: str, keyword_hits: dict | None = None, rule_pack=None) -> dict:
+    """
+    규칙 기반 안전도 분석. 페이지 단위로 미리 누적한 keyword_hits를 넘기면 키워드 검사를 다시 하지 않습니다.
+    keyword_hits를 넘길 때는 그때 사용한 rule_pack도 함께 넘겨야 같은 규칙 버전으로 채점됩니다.
+    """
     alerts, safety_score = [], 100
+    rule_pack = rule_pack or get_active_rule_pack()
     try:
         # 1. 기존의 키워드 기반 분석 (유지)
-        categories = {
-            "보증금_반환": {"keywords": ["보증금", "반환", "즉시", "계약종료"], "risk": "CRITICAL"},
-            "권리관계_유지": {"keywords": ["권리관계", "익일", "근저당", "대항력"], "risk": "CRITICAL"},
-            "전세자금대출": {"keywords": ["대출", "불가", "무효", "전세자금"], "risk": "WARNING"},
-            "수선_의무": {"keywords": ["수선", "하자", "파손", "수리"], "risk": "ADVISORY"},
-            "특약사항": {"keywords": ["특약", "기타사항", "추가조건"], "risk": "ADVISORY"}
-        }
-        for cat_name, info in categories.items():
+        if keyword_hits is None:
+            keyword_hits = scan_rule_keywords(contract_text, rule_pack=rule_pack)
+        for cat_name, info in rule_pack["categories"].items():
             display_name = cat_name.replace('_', ' ').title()
-            keyword_count = sum(1 for kw in info['keywords'] if kw in contract_text)
-            if keyword_count < len(info['keywords']) * 0.5:
+            keyword_count = len(keyword_hits.get(cat_name, {}))
+            rule_count = len(info['keywords']) + len(info['patterns'])
+            if keyword_count < rule_count * rule_pack["threshold"]:
+                safety_score -= rule_pack["penalties"][info['risk']]
                 if info['risk'] == "CRITICAL":
-                    safety_score -= 40
                     alerts.append(f"🚨 [치명적!] {display_name}: 관련 조항이 누락되었거나 미비하여 심각한 위험이 발생할 수 있습니다!")
                 elif info['risk'] == "WARNING":
-                    safety_score -= 20
                     alerts.append(f"⚠️ [위험] {display_name}: 관련 조항이 부족하여 주의가 필요합니다.")
                 else:
-                    safety_score -= 10
                     alerts.append(f"💡 [권장] {display_name}: 분쟁 예방을 위해 관련 조항 보강을 권장합니다.")
             else:
                 alerts.append(f"✅ [{display_name}] 관련 조항이 확인되었습니다.")
@@ -669,21 +1464,19 @@ def perform_rule_based_analysis(contract_text: str) -> dict:
         if landlord_name == "이름 자동 추출 실패":
             alerts.append("⚠️ [임대인 검사] 계약서에서 임대인 이름을 자동으로 찾지 못했습니다. 직접 확인이 필요합니다.")
         else:
-            found_defaulter = False
             try:
-                with open(DEFAULTER_LIST_PATH, 'r', encoding='utf-8-sig') as f:
-                    # CSV 파일의 모든 행을 미리 리스트로 로드하여 검색 효율성 증대
-                    defaulter_list = list(csv.DictReader(f))
-                    for row in defaulter_list:
-                        # 이름 비교 시 공백 제거 후 비교
-                        defaulter_name = row.get('성명', '').strip().replace(' ', '')
-                        if landlord_name == defaulter_name:
-                            safety_score = 0  # << 치명적 위험이므로 안전점수 0점으로 조정
-                            alerts.append(f"🚨🚨🚨 [치명적 위험!] 임대인 '{landlord_name}'이(가) 상습 채무 불이행자 명단에 포함되어 있습니다! **계약을 즉시 중단하고 전문가와 상담하세요.**")
-                            found_defaulter = True
-                            break
-                if not found_defaulter:
-                    alerts.append(f"✅ [임대인 검사] 임대인('{landlord_name}')은(는) 상습 채무 불이행자 명단에 없습니다.")
+                # 공동 임대인·법인 임대인을 한 번에 조회하고, OCR 오탈자에 대비해 유사 이름도 확인합니다.
+                screening = screen_landlord_names(split_candidate_names(landlord_name) or [landlord_name])
+                for name, result in screening.items():
+                    if result["exact"]:
+                        safety_score = 0  # << 치명적 위험이므로 안전점수 0점으로 조정
+                        alerts.append(f"🚨🚨🚨 [치명적 위험!] 임대인 '{name}'이(가) 상습 채무 불이행자 명단에 포함되어 있습니다! **계약을 즉시 중단하고 전문가와 상담하세요.**")
+                    elif result["similar"]:
+                        # 유사 이름은 동명이인이 아닌 다른 사람일 가능성이 높아 감점하지 않고 확인만 요청합니다.
+                        similar_names = ", ".join(f"'{candidate}'" for candidate, _ in result["similar"][:3])
+                        alerts.append(f"🔎 [임대인 검사 - 확인 필요] 임대인 '{name}'과(와) 비슷한 이름({similar_names})이 상습 채무 불이행자 명단에 있습니다. 글자 인식 오류일 수 있으니 신분증과 등기부등본으로 직접 확인하세요.")
+                    else:
+                        alerts.append(f"✅ [임대인 검사] 임대인('{name}')은(는) 상습 채무 불이행자 명단에 없습니다.")
             except FileNotFoundError:
                 alerts.append(f"⚠️ [임대인 검사] 상습 채무불이행자 명단 파일을 찾을 수 없어 조회가 불가능합니다. ({DEFAULTER_LIST_PATH})")
             except Exception as e:
@@ -696,7 +1489,14 @@ def perform_rule_based_analysis(contract_text: str) -> dict:
     # 안전 점수 순으로 정렬하여 중요한 경고가 위로 오게 함
     alerts.sort(key=lambda x: ('🚨' not in x, '⚠️' not in x, '💡' not in x, '✅' not in x))
 
-    return {"alerts": alerts, "safety_score": safety_score}
+    highlights = build_clause_highlights(contract_text, keyword_hits) if keyword_hits else {}
+    return {
+        "alerts": alerts,
+        "safety_score": safety_score,
+        "matches": keyword_hits or {},
+        "highlights": highlights,
+        "rule_pack_version": rule_pack["version"],
+    }
 
 def google_text_to_speech(text, lang_code="KO"):
     if not GOOGLE_API_KEY:
@@ -758,17 +1558,349 @@ def google_text_to_speech(text, lang_code="KO"):
         print(f"❌ TTS 중 예외 발생: {e}")
         return None, f"❌ 음성 생성 중 오류: {e}"
 
+# 임베딩 캐시: (모델, 용도, 텍스트) SHA-256 → float32 벡터. 메모리 LRU 뒤에 디스크(.f32 파일)를 둡니다.
+EMBEDDING_MEMORY_CACHE = OrderedDict()
+EMBEDDING_CACHE_STATS = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+_EMBEDDING_CACHE_LOCK = threading.Lock()
+EMBEDDING_EVICT_EVERY = 64  # 디스크 용량 정리는 이 횟수만큼 저장할 때마다 한 번씩 수행
+
+class CachedUpstageEmbeddings(Embeddings):
+    """
+    UpstageEmbeddings 앞단의 임베딩 캐시입니다. 같은 텍스트는 임베딩 API를 다시 호출하지 않습니다.
+    질의용(embed_query)과 문서용(embed_documents)은 Upstage에서 서로 다른 모델을 쓰므로 따로 캐시합니다.
+    """
+
+    def __init__(self, model: str = "solar-embedding-1-large"):
+        self.model = model
+        self._embeddings = UpstageEmbeddings(model=model)
+        self._writes = 0
+
+    def _key(self, kind: str, text: str) -> str:
+        return sha256_of_text(f"{self.model}\n{kind}\n{text}")
+
+    def _get(self, key: str):
+        with _EMBEDDING_CACHE_LOCK:
+            vector = EMBEDDING_MEMORY_CACHE.get(key)
+            if vector is not None:
+                EMBEDDING_MEMORY_CACHE.move_to_end(key)
+                EMBEDDING_CACHE_STATS["memory_hits"] += 1
+                return vector.tolist()
+        data = disk_cache_read_bytes(EMBEDDING_CACHE_DIR, key, ".f32")
+        if data is None:
+            return None
+        vector = array('f')
+        vector.frombytes(data)
+        self._remember(key, vector)
+        with _EMBEDDING_CACHE_LOCK:
+            EMBEDDING_CACHE_STATS["disk_hits"] += 1
+        return vector.tolist()
+
+    def _remember(self, key: str, vector: array):
+        with _EMBEDDING_CACHE_LOCK:
+            EMBEDDING_MEMORY_CACHE[key] = vector
+            EMBEDDING_MEMORY_CACHE.move_to_end(key)
+            while len(EMBEDDING_MEMORY_CACHE) > EMBEDDING_CACHE_MEMORY_ENTRIES:
+                EMBEDDING_MEMORY_CACHE.popitem(last=False)
+
+    def _put(self, key: str, values: list):
+        vector = array('f', values)
+        self._remember(key, vector)
+        try:
+            disk_cache_write_bytes(EMBEDDING_CACHE_DIR, key, ".f32", vector.tobytes())
+            self._writes += 1
+            if self._writes % EMBEDDING_EVICT_EVERY == 0:
+                evicted = evict_disk_cache(EMBEDDING_CACHE_DIR, EMBEDDING_CACHE_MAX_BYTES)
+                with _EMBEDDING_CACHE_LOCK:
+                    EMBEDDING_CACHE_STATS["evictions"] += evicted
+        except OSError as e:
+            print(f"⚠️ 임베딩 캐시 저장 실패: {e}")
+
+    def embed_query(self, text: str) -> list:
+        key = self._key("query", text)
+        cached = self._get(key)
+        if cached is not None:
+            return cached
+        with _EMBEDDING_CACHE_LOCK:
+            EMBEDDING_CACHE_STATS["misses"] += 1
+        vector = self._embeddings.embed_query(text)
+        self._put(key, vector)
+        return vector
+
+    def embed_documents(self, texts: list) -> list:
+        keys = [self._key("passage", text) for text in texts]
+        results = [self._get(key) for key in keys]
+        # 캐시에 없는 텍스트만 (같은 텍스트는 한 번만) 모아서 한 번에 임베딩합니다.
+        missing = {}
+        for i, vector in enumerate(results):
+            if vector is None:
+                missing.setdefault(keys[i], []).append(i)
+        if missing:
+            with _EMBEDDING_CACHE_LOCK:
+                EMBEDDING_CACHE_STATS["misses"] += len(missing)
+            vectors = self._embeddings.embed_documents([texts[indices[0]] for indices in missing.values()])
+            for (key, indices), vector in zip(missing.items(), vectors):
+                self._put(key, vector)
+                for i in indices:
+                    results[i] = vector
+        return results
+
+# 조문 번호 직접 조회 색인: '제3조의2' → 조문 Document (벡터 검색 없이 바로 찾기)
+ARTICLE_INDEX = {}
+
+def build_article_index():
+    """주택임대차보호법 조문 색인을 만듭니다."""
+    global ARTICLE_INDEX
+    try:
+        with open(LAW_PARSED_PATH, 'r', encoding='utf-8') as f:
+            law_text = json.load(f).get("text", "")
+    except FileNotFoundError:
+        return
+    except Exception as e:
+        print(f"⚠️ 조문 색인 생성 실패: {e}")
+        return
+    ARTICLE_INDEX = {
+        article_key: Document(
+            page_content=article_text,
+            metadata={"source": "housing_lease_law", "article": article_key, "article_title": article_title}
+        )
+        for article_key, article_title, article_text in split_law_into_articles(law_text)
+    }
+    print(f"✅ 조문 색인 생성 완료 ({len(ARTICLE_INDEX)}개 조문)")
+
+def lookup_law_articles(question: str) -> list:
+    """
+    질문에 '제N조', '제N조의M' 같은 조문 번호가 있으면 주택임대차보호법의 해당 조문 Document를 반환합니다.
+    민법 등 다른 법령 이름이 함께 나오면 그 법의 조문일 수 있으므로 빈 목록을 반환합니다.
+    """
+    for law_name in LAW_NAME_RE.findall(question or ''):
+        if '임대차' not in law_name and law_name != '주임법' and not law_name.endswith(NON_LAW_WORDS):
+            return []
+    docs = []
+    for m in LAW_ARTICLE_REF_RE.finditer(question or ''):
+        doc = ARTICLE_INDEX.get(law_article_key(m.group(1), m.group(2)))
+        if doc is not None and doc not in docs:
+            docs.append(doc)
+    return docs
+
 RETRIEVER = None
+# 현재 검색기가 사용하는 지식 베이스 버전 (Vector DB 파일의 수정 시각 기준)
+KNOWLEDGE_BASE_STATE = {"version": None}
+
+def get_knowledge_base_version() -> str:
+    """Vector DB의 현재 버전을 반환합니다. DB가 다시 구축되거나 갱신되면 값이 바뀝니다."""
+    db_file = os.path.join(CHROMA_DB_PATH, "chroma.sqlite3")
+    target = db_file if os.path.exists(db_file) else CHROMA_DB_PATH
+    try:
+        return str(os.stat(target).st_mtime_ns)
+    except OSError:
+        return None
+
+# 어휘 검색용 BM25 색인 (Vector DB의 청크 전체를 대상으로 시작 시 생성)
+VECTORSTORE = None
+BM25_INDEX = None
+# 벡터 검색용 스냅샷: {"matrix": 정규화된 float32 행렬(mmap), "docs": Document 목록, "embeddings": 질의 임베딩 함수}
+RETRIEVAL_SNAPSHOT = None
+
+def knowledge_base_snapshot_tag() -> str:
+    """마지막으로 완료된 지식 베이스 구축의 식별값입니다. (원천 파일 해시 기록의 SHA-256, 기록이 없으면 None)"""
+    manifest = disk_cache_read_json(CACHE_DIR, KB_MANIFEST_KEY)
+    return sha256_of_text(json.dumps(manifest, sort_keys=True, ensure_ascii=False)) if manifest else None
+
+def export_retrieval_snapshot(vectorstore, tag: str):
+    """Chroma에 저장된 임베딩을 정규화된 float32 행렬(.npy)과 메타데이터(JSON)로 내보냅니다."""
+    stored = vectorstore.get(include=["embeddings", "documents", "metadatas"])
+    matrix = np.asarray(stored["embeddings"], dtype=np.float32)
+    if matrix.ndim != 2 or not len(matrix):
+        raise ValueError("내보낼 임베딩이 없습니다.")
+    matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+    RETRIEVAL_SNAPSHOT_DIR.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=RETRIEVAL_SNAPSHOT_DIR, suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, np.ascontiguousarray(matrix))
+        os.replace(tmp_path, RETRIEVAL_SNAPSHOT_DIR / "embeddings.npy")
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    # 메타데이터를 마지막에 기록하므로, 태그가 맞는 메타데이터가 있으면 행렬도 같은 버전입니다.
+    disk_cache_write_json(RETRIEVAL_SNAPSHOT_DIR, "metadata", {
+        "tag": tag, "ids": stored["ids"], "documents": stored["documents"],
+        "metadatas": stored["metadatas"], "dim": int(matrix.shape[1]),
+    }, max_bytes=float("inf"))
+    print(f"💾 검색 스냅샷 저장 완료 ({matrix.shape[0]}개 청크 × {matrix.shape[1]}차원)")
+
+def load_retrieval_snapshot(tag: str):
+    """태그가 일치하는 검색 스냅샷을 읽습니다. 행렬은 mmap으로 열어 여러 프로세스가 페이지 캐시를 공유합니다."""
+    if tag is None:
+        return None
+    meta = disk_cache_read_json(RETRIEVAL_SNAPSHOT_DIR, "metadata")
+    if not meta or meta.get("tag") != tag:
+        return None
+    matrix = np.load(RETRIEVAL_SNAPSHOT_DIR / "embeddings.npy", mmap_mode="r")
+    if matrix.shape != (len(meta["ids"]), meta["dim"]):
+        return None
+    return {
+        "matrix": matrix,
+        "texts": meta["documents"],
+        "metadatas": meta["metadatas"],
+        "docs": [Document(page_content=t, metadata=m or {}) for t, m in zip(meta["documents"], meta["metadatas"])],
+        "embeddings": CachedUpstageEmbeddings(model="solar-embedding-1-large"),
+    }
+
+def vector_search(query: str, k: int, query_vector=None) -> list:
+    """
+    질의와 가장 가까운 청크 k개를 반환합니다. 스냅샷이 있으면 행렬 내적으로, 없으면 Chroma로 검색합니다.
+    query_vector가 있으면 질의를 다시 임베딩하지 않습니다.
+    """
+    if RETRIEVAL_SNAPSHOT is None:
+        if query_vector is not None:
+            return VECTORSTORE.similarity_search_by_vector(list(query_vector), k=k)
+        return VECTORSTORE.similarity_search(query, k=k)
+    matrix = RETRIEVAL_SNAPSHOT["matrix"]
+    if query_vector is None:
+        query_vector = RETRIEVAL_SNAPSHOT["embeddings"].embed_query(query)
+    query_vector = np.array(query_vector, dtype=np.float32)
+    query_vector /= max(float(np.linalg.norm(query_vector)), 1e-12)
+    scores = matrix @ query_vector
+    k = min(k, len(scores))
+    if k <= 0:
+        return []
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    return [RETRIEVAL_SNAPSHOT["docs"][i] for i in top]
+
+def lexical_terms(text: str) -> list:
+    """BM25용 토큰: 한글·영숫자 덩어리를 글자 2-gram으로 나눕니다. (한 글자 덩어리는 그대로 사용)"""
+    terms = []
+    for word in re.findall(r'[가-힣]+|[a-z0-9]+', unicodedata.normalize('NFC', text or '').lower()):
+        if len(word) == 1:
+            terms.append(word)
+        else:
+            terms.extend(word[i:i + 2] for i in range(len(word) - 1))
+    return terms
+
+def build_bm25_index(texts: list, metadatas: list) -> dict:
+    """청크 텍스트로 BM25 역색인을 만듭니다. postings: 용어 → [(문서 번호, 빈도)]"""
+    postings, doc_lengths = {}, []
+    for doc_idx, text in enumerate(texts):
+        terms = lexical_terms(text)
+        doc_lengths.append(len(terms))
+        counts = {}
+        for term in terms:
+            counts[term] = counts.get(term, 0) + 1
+        for term, tf in counts.items():
+            postings.setdefault(term, []).append((doc_idx, tf))
+    n_docs = len(texts)
+    idf = {term: math.log(1 + (n_docs - len(p) + 0.5) / (len(p) + 0.5)) for term, p in postings.items()}
+    return {
+        "docs": [Document(page_content=t, metadata=m or {}) for t, m in zip(texts, metadatas)],
+        "postings": postings, "idf": idf, "doc_lengths": doc_lengths,
+        "avg_length": (sum(doc_lengths) / n_docs) if n_docs else 0.0,
+    }
+
+def bm25_search(index: dict, query: str, top_n: int) -> list:
+    """BM25 점수 상위 top_n개의 (문서 번호, 점수)를 반환합니다."""
+    scores = {}
+    avg_length = index["avg_length"] or 1.0
+    for term in set(lexical_terms(query)):
+        idf = index["idf"].get(term)
+        if idf is None:
+            continue
+        for doc_idx, tf in index["postings"][term]:
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * index["doc_lengths"][doc_idx] / avg_length)
+            scores[doc_idx] = scores.get(doc_idx, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_n]
+
+def rerank_documents(query: str, candidates: list) -> list:
+    """
+    RRF 상위 후보를 질의 용어(2-gram) 적중률로 다시 정렬합니다. 용어별 IDF로 가중해 희귀한 법률 용어가 더 큰 비중을 갖습니다.
+    candidates: [(RRF 점수, Document)] → 점수 순 Document 목록
+    """
+    idf = BM25_INDEX["idf"] if BM25_INDEX else {}
+    query_terms = set(lexical_terms(query))
+    total_weight = sum(idf.get(t, 0.0) for t in query_terms) or 1.0
+    best_rrf = max((score for score, _ in candidates), default=1.0) or 1.0
+    scored = []
+    for rrf_score, doc in candidates:
+        doc_terms = set(lexical_terms(doc.page_content))
+        coverage = sum(idf.get(t, 0.0) for t in query_terms & doc_terms) / total_weight
+        scored.append((rrf_score / best_rrf + coverage, doc))
+    scored.sort(key=lambda item: item[0], reverse=True)
+    return [doc for _, doc in scored]
+
+def hybrid_retrieve(query) -> list:
+    """
+    벡터 검색과 BM25 결과를 RRF로 합치고, 필요하면 로컬 재정렬 후 상위 RETRIEVER_K개 Document를 반환합니다.
+    query는 문자열이거나, 이미 임베딩한 질의 벡터를 함께 넘기는 {"query", "vector"} dict입니다.
+    """
+    query_vector = None
+    if isinstance(query, dict):
+        query, query_vector = query["query"], query.get("vector")
+    fused = {}
+
+    def add_ranked(docs):
+        for rank, doc in enumerate(docs):
+            key = sha256_of_text(doc.page_content)
+            score, _ = fused.get(key, (0.0, doc))
+            fused[key] = (score + 1.0 / (RRF_K + rank + 1), doc)
+
+    add_ranked(vector_search(query, HYBRID_CANDIDATES, query_vector))
+    if BM25_INDEX:
+        add_ranked([BM25_INDEX["docs"][doc_idx] for doc_idx, _ in bm25_search(BM25_INDEX, query, HYBRID_CANDIDATES)])
+
+    candidates = sorted(fused.values(), key=lambda item: item[0], reverse=True)
+    if HYBRID_RERANK:
+        return rerank_documents(query, candidates[:HYBRID_CANDIDATES])[:RETRIEVER_K]
+    return [doc for _, doc in candidates[:RETRIEVER_K]]
+
 def initialize_retriever():
-    """전역 RAG 검색기를 초기화합니다."""
-    global RETRIEVER
+    """
+    전역 RAG 검색기를 초기화합니다. 지식 베이스 버전이 바뀌었으면 상담 답변 캐시를 비웁니다.
+    Chroma 벡터 검색과 BM25 어휘 검색을 함께 쓰는 하이브리드 검색기이며, BM25 색인 생성에 실패하면 벡터 검색만 사용합니다.
+    """
+    global RETRIEVER, VECTORSTORE, BM25_INDEX, RETRIEVAL_SNAPSHOT
+    build_article_index()
+    kb_version = get_knowledge_base_version()
+    if kb_version != KNOWLEDGE_BASE_STATE["version"]:
+        KNOWLEDGE_BASE_STATE["version"] = kb_version
+        invalidate_answer_cache()
     if os.path.exists(CHROMA_DB_PATH):
         try:
-            vectorstore = Chroma(
+            VECTORSTORE = Chroma(
                 persist_directory=CHROMA_DB_PATH,
-                embedding_function=UpstageEmbeddings(model="solar-embedding-1-large")
+                embedding_function=CachedUpstageEmbeddings(model="solar-embedding-1-large")
             )
-            RETRIEVER = vectorstore.as_retriever(search_kwargs={"k": 5})
+            # 벡터 검색은 메모리 매핑한 임베딩 행렬 스냅샷으로 수행 (없거나 오래되었으면 Chroma에서 다시 내보냄)
+            RETRIEVAL_SNAPSHOT = None
+            if NUMPY_AVAILABLE:
+                try:
+                    tag = knowledge_base_snapshot_tag()
+                    if tag is None:
+                        # 구축 기록이 없으면 스냅샷이 어떤 지식 베이스인지 알 수 없어 매번 다시 내보내게 되므로 Chroma만 사용
+                        print("ℹ️ 지식 베이스 구축 기록이 없어 검색 스냅샷 없이 Chroma로 검색합니다.")
+                    else:
+                        RETRIEVAL_SNAPSHOT = load_retrieval_snapshot(tag)
+                        if RETRIEVAL_SNAPSHOT is None:
+                            export_retrieval_snapshot(VECTORSTORE, tag)
+                            RETRIEVAL_SNAPSHOT = load_retrieval_snapshot(tag)
+                        print(f"✅ 검색 스냅샷 로드 완료 ({RETRIEVAL_SNAPSHOT['matrix'].shape[0]}개 청크)")
+                except Exception as e:
+                    RETRIEVAL_SNAPSHOT = None
+                    print(f"⚠️ 검색 스냅샷을 사용할 수 없어 Chroma로 검색합니다: {e}")
+            try:
+                if RETRIEVAL_SNAPSHOT is not None:
+                    texts, metadatas = RETRIEVAL_SNAPSHOT["texts"], RETRIEVAL_SNAPSHOT["metadatas"]
+                else:
+                    stored = VECTORSTORE.get(include=["documents", "metadatas"])
+                    texts, metadatas = stored["documents"], stored["metadatas"]
+                BM25_INDEX = build_bm25_index(texts, metadatas)
+                print(f"✅ BM25 색인 생성 완료 ({len(texts)}개 청크, {len(BM25_INDEX['postings'])}개 용어)")
+            except Exception as e:
+                BM25_INDEX = None
+                print(f"⚠️ BM25 색인 생성 실패, 벡터 검색만 사용합니다: {e}")
+            RETRIEVER = RunnableLambda(hybrid_retrieve)
             print("✅ RAG 검색기(Retriever) 초기화 완료.")
         except Exception as e:
             print(f"❌ RAG 검색기 초기화 실패: {e}")
@@ -1159,181 +2291,6 @@ def md_to_html(md_text: str) -> str:
     
     return html
 
-def preprocess_markdown_for_translation(text: str) -> str:
-    """
-    Solar Pro2 번역 전/후 마크다운 전처리하여 구조 보존을 강화합니다.
-    테이블, 헤딩, 리스트 등의 구조를 보호합니다.
-    """
-    if not text:
-        return text
-    
-    # 1. 테이블 구조 보존을 위한 전처리
-    text = preprocess_tables_for_solar(text)
-    
-    # 2. 헤딩 구조 보존
-    text = preprocess_headers_for_solar(text)
-    
-    # 3. 리스트 구조 보존
-    text = preprocess_lists_for_solar(text)
-    
-    # 4. 코드 블록 보존
-    text = preprocess_code_blocks_for_solar(text)
-    
-    return text
-
-def preprocess_tables_for_solar(text: str) -> str:
-    """테이블 구조를 Solar Pro2가 잘 인식할 수 있도록 전처리 - 강화된 버전"""
-    lines = text.split('\n')
-    processed_lines = []
-    in_table = False
-    table_buffer = []
-    
-    for line in lines:
-        stripped = line.strip()
-        
-        # 테이블 시작 감지 (파이프 | 포함, URL 제외)
-        if '|' in stripped and not stripped.startswith('http') and not stripped.startswith('https'):
-            if not in_table:
-                in_table = True
-                table_buffer = []
-                # 테이블 시작 마커와 명확한 지침 추가
-                processed_lines.append("<!-- TABLE_START: 다음 테이블은 | 구분자를 정확히 유지해야 합니다 -->")
-            table_buffer.append(line)
-        # 테이블 구분선 감지 (더 포괄적인 패턴)
-        elif in_table and ('---' in stripped or '===' in stripped or ':-:' in stripped or re.match(r'^[\|\-\s\:]+$', stripped)):
-            table_buffer.append(line)
-        # 테이블 종료 감지
-        elif in_table and (not stripped or ('|' not in stripped and stripped)):
-            # 테이블 버퍼 처리
-            if table_buffer:
-                processed_table = process_table_markdown_for_solar(table_buffer)
-                processed_lines.extend(processed_table)
-                processed_lines.append("<!-- TABLE_END: 위 테이블 형식을 번역 후에도 정확히 유지하세요 -->")
-                table_buffer = []
-            in_table = False
-            processed_lines.append(line)
-        # 테이블 내부 라인
-        elif in_table:
-            table_buffer.append(line)
-        # 일반 텍스트
-        else:
-            processed_lines.append(line)
-    
-    # 마지막 테이블 처리
-    if table_buffer:
-        processed_table = process_table_markdown_for_solar(table_buffer)
-        processed_lines.extend(processed_table)
-        processed_lines.append("<!-- TABLE_END: 위 테이블 형식을 번역 후에도 정확히 유지하세요 -->")
-    
-    return '\n'.join(processed_lines)
-
-def process_table_markdown_for_solar(table_lines: list) -> list:
-    """Solar Pro2 번역을 위한 테이블 마크다운 정제 - 강화된 버전"""
-    if not table_lines:
-        return []
-    
-    processed_lines = []
-    
-    for i, line in enumerate(table_lines):
-        stripped = line.strip()
-        
-        if '|' in stripped:
-            # 테이블 구분선 처리
-            if re.match(r'^[\|\-\s\:]+$', stripped):
-                # 구분선 정규화 (---|---|--- 형태로)
-                cells = stripped.split('|')
-                separator_cells = []
-                for cell in cells:
-                    cell = cell.strip()
-                    if cell == '' or re.match(r'^[\-\:]+$', cell):
-                        separator_cells.append('---')
-                    else:
-                        separator_cells.append('---')
-                
-                # 양쪽 끝 빈 셀 제거 후 구분선 생성
-                if separator_cells and separator_cells[0] == '---':
-                    separator_cells = separator_cells[1:]
-                if separator_cells and separator_cells[-1] == '---':
-                    separator_cells = separator_cells[:-1]
-                
-                processed_line = '| ' + ' | '.join(['---'] * len(separator_cells)) + ' |'
-                processed_lines.append(processed_line)
-                continue
-            
-            # 일반 테이블 셀 처리
-            cells = stripped.split('|')
-            cleaned_cells = []
-            
-            for cell in cells:
-                cleaned_cell = cell.strip()
-                # 베트남어, 우크라이나어 특수 문자 보존
-                if cleaned_cell:
-                    cleaned_cell = preserve_special_chars_for_translation(cleaned_cell)
-                cleaned_cells.append(cleaned_cell)
-            
-            # 테이블 구조 표준화
-            if not stripped.startswith('|'):
-                # 시작 파이프 없음
-                processed_line = '| ' + ' | '.join(cleaned_cells) + ' |'
-            elif not stripped.endswith('|'):
-                # 끝 파이프 없음  
-                processed_line = '| ' + ' | '.join(cleaned_cells) + ' |'
-            else:
-                # 양쪽 파이프 있음 - 첫/마지막 빈 셀 제거
-                if cleaned_cells and cleaned_cells[0] == '':
-                    cleaned_cells = cleaned_cells[1:]
-                if cleaned_cells and cleaned_cells[-1] == '':
-                    cleaned_cells = cleaned_cells[:-1]
-                processed_line = '| ' + ' | '.join(cleaned_cells) + ' |'
-            
-            processed_lines.append(processed_line)
-        else:
-            processed_lines.append(line)
-    
-    return processed_lines
-
-def preprocess_headers_for_solar(text: str) -> str:
-    """헤딩 구조를 Solar Pro2가 잘 인식할 수 있도록 전처리"""
-    # 헤딩 앞뒤에 명확한 구분 추가
-    text = re.sub(r'^(#{1,6})\s*(.+)$', r'\1 \2', text, flags=re.MULTILINE)
-    return text
-
-def preprocess_lists_for_solar(text: str) -> str:
-    """리스트 구조를 Solar Pro2가 잘 인식할 수 있도록 전처리"""
-    # 순서 있는 리스트 정규화
-    text = re.sub(r'^(\s*)(\d+)\.\s*(.+)$', r'\1\2. \3', text, flags=re.MULTILINE)
-    
-    # 순서 없는 리스트 정규화
-    text = re.sub(r'^(\s*)[-*+]\s*(.+)$', r'\1- \2', text, flags=re.MULTILINE)
-    
-    return text
-
-def preprocess_code_blocks_for_solar(text: str) -> str:
-    """코드 블록 구조를 Solar Pro2가 잘 인식할 수 있도록 전처리"""
-    # 코드 블록 마커 명확화
-    text = re.sub(r'^```(\w*)\s*$', r'```\1', text, flags=re.MULTILINE)
-    
-    return text
-
-def preserve_special_chars_for_translation(text: str) -> str:
-    """번역 시 특수 문자들을 보존"""
-    # 베트남어 특수 문자 보존 (기존 함수 재사용)
-    text = preserve_vietnamese_chars(text)
-    
-    # 우크라이나어 키릴 문자 보존
-    ukrainian_chars = {
-        'а': 'а', 'б': 'б', 'в': 'в', 'г': 'г', 'ґ': 'ґ', 'д': 'д', 'е': 'е', 'є': 'є', 
-        'ж': 'ж', 'з': 'з', 'и': 'и', 'і': 'і', 'ї': 'ї', 'й': 'й', 'к': 'к', 'л': 'л', 
-        'м': 'м', 'н': 'н', 'о': 'о', 'п': 'п', 'р': 'р', 'с': 'с', 'т': 'т', 'у': 'у', 
-        'ф': 'ф', 'х': 'х', 'ц': 'ц', 'ч': 'ч', 'ш': 'ш', 'щ': 'щ', 'ь': 'ь', 'ю': 'ю', 'я': 'я'
-    }
-    
-    for original, preserved in ukrainian_chars.items():
-        text = text.replace(original, preserved)
-        text = text.replace(original.upper(), preserved.upper())
-    
-    return text
-
 def process_table_markdown(table_lines: list) -> list:
     """
     테이블 마크다운을 처리하여 깨짐 현상을 방지합니다.
@@ -1515,8 +2472,8 @@ def create_translated_html(translated_text: str, title: str = "번역된 내용"
         processed_text = processed_text.replace("ỵ", "ỵ").replace("ỷ", "ỷ").replace("ỹ", "ỹ")
         processed_text = processed_text.replace("đ", "đ")
     
-    # Solar Pro2 번역 최적화를 위한 마크다운 전처리 (구조 보존 강화)
-    processed_text = preprocess_markdown_for_translation(processed_text)
+    # 표 열 수와 구분선을 맞춰 일정한 형식으로 다시 직렬화
+    processed_text = serialize_markdown_blocks(parse_markdown_blocks(processed_text))
     
     html_content = md_to_html(processed_text)
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M")
@@ -1541,31 +2498,114 @@ def create_translated_html(translated_text: str, title: str = "번역된 내용"
     </html>
     """
 
-def extract_landlord_name_robustly(contract_text: str) -> str:
-    """🔥 3단계에 걸쳐 임대인 이름을 집요하게 추출하는 함수 (Gradio용 수정)"""
-    llm = ChatUpstage()
+# 규칙 기반 임대인 이름 추출 (표준 임대차계약서 서식 기준)
+LANDLORD_RULE_MIN_CONFIDENCE = 0.8
+LANDLORD_NAME_CACHE = OrderedDict()
+LANDLORD_NAME_CACHE_SIZE = 256
+_LANDLORD_NAME_CACHE_LOCK = threading.Lock()
 
-    # --- 1단계: 이름만 정확히 추출 시도 ---
-    prompt_step1 = ChatPromptTemplate.from_template(
-        "다음 계약서 텍스트에서 '임대인' 또는 '집주인'의 이름만 정확하게 추출해줘. "
-        "다른 말은 모두 제외하고 이름만 말해줘. (예: 홍길동). "
-        "만약 이름이 없으면 '없음'이라고 말해줘. 텍스트: {contract}"
-    )
-    chain_step1 = prompt_step1 | llm | StrOutputParser()
+COMMON_KOREAN_SURNAMES = set(
+    "김이박최정강조윤장임한오서신권황안송류전홍고문양손배백허유남심노하곽성차주우구민진나지엄채원천방공현함변염여추도소석선설마길연위표명기반왕금옥육인맹제모탁국어은편용예봉경사부황보"
+)
+LANDLORD_NAME_STOPWORDS = {
+    "주소", "성명", "주민등록", "주민등록번호", "전화", "연락처", "대리인", "서명", "날인", "본인",
+    "소유자", "임차인", "임대인", "공인중개사", "중개업자", "사업자", "법인", "상호", "대표", "대표자",
+    "기타", "특약", "계약", "계약서", "보증금", "차임", "월세", "전세", "은행", "계좌",
+}
+
+def is_plausible_person_name(name: str) -> bool:
+    """2~5글자 한글이며 흔한 성씨로 시작하고 서식 단어가 아닌지 확인합니다."""
+    return (
+        bool(re.fullmatch(r'[가-힣]{2,5}', name))
+        and name not in LANDLORD_NAME_STOPWORDS
+        and name[0] in COMMON_KOREAN_SURNAMES
+    )
+
+def extract_landlord_names_by_rules(contract_text: str) -> tuple[list, float]:
+    """
+    표준 임대차계약서의 임대인 란(임대인/성명/주민등록번호)을 정규식으로 읽어 이름 목록과 신뢰도(0~1)를 반환합니다.
+    - 임대인 란 안의 '성명 홍길동' (주민등록번호가 함께 있으면 더 높은 신뢰도)
+    - '임대인: 홍길동', '임대인(갑) 홍길동'
+    - '임대인 홍길동 (인)' 처럼 이름 뒤에 서명/날인 표시가 오는 경우
+    임대인 란의 '성명'만 LANDLORD_RULE_MIN_CONFIDENCE 이상이며, 나머지 약한 규칙은 LLM 확인을 거칩니다.
+    """
+    # OCR 결과에서 자주 보이는 '임 대 인', '성 명' 같은 띄어쓰기를 먼저 정규화합니다.
+    text = re.sub(r'임\s*대\s*인', '임대인', contract_text or '')
+    text = re.sub(r'임\s*차\s*인', '임차인', text)
+    text = re.sub(r'대\s*리\s*인', '대리인', text)
+    text = re.sub(r'성\s+명', '성명', text)
+
+    found = {}
+
+    def add(name, confidence):
+        if is_plausible_person_name(name):
+            found[name] = max(found.get(name, 0.0), confidence)
+
+    # 1) 임대인 란: '임대인'부터 다음 '대리인'/'임차인'/'중개' 전까지(최대 300자)에서 '성명' 항목 찾기
+    #    (대리인 란의 성명을 공동 임대인으로 잘못 읽지 않도록 대리인에서 끊습니다)
+    for block_match in re.finditer(r'임대인(?:\s*\d)?(.{0,300}?(?=대리인|임차인|중개)|.{0,300})', text, flags=re.DOTALL):
+        block = block_match.group(1)
+        has_resident_number = bool(re.search(r'\d{6}\s*-\s*[\d\*]{1,7}', block))
+        for name_match in re.finditer(r'성명\s*[:：]?\s*([가-힣]{2,5})(?![가-힣])', block):
+            add(name_match.group(1), 0.95 if has_resident_number else 0.85)
+
+    # 2) '임대인: 홍길동', '임대인(갑) 홍길동'
+    for name_match in re.finditer(r'임대인\s*(?:\(\s*갑\s*\)\s*[:：]?|[:：])\s*([가-힣]{2,5})(?![가-힣])', text):
+        add(name_match.group(1), 0.7)
+
+    # 3) '임대인 홍길동 (인)' — 서명/날인 표시나 주민등록번호가 이름 뒤에 바로 오는 경우
+    for name_match in re.finditer(r'임대인\s+([가-힣]{2,5})\s*(?=\(\s*(?:인|서명|印)|\d{6}\s*-)', text):
+        add(name_match.group(1), 0.6)
+
+    if not found:
+        return [], 0.0
+    names = sorted(found, key=lambda n: -found[n])
+    return names, min(found.values())
+
+def extract_landlord_name_robustly(contract_text: str) -> str:
+    """
+    임대인 이름을 추출합니다. 규칙 기반 추출을 먼저 시도하고, 신뢰도가 낮을 때만 LLM을 호출합니다.
+    결과는 계약서 텍스트 해시별로 캐시합니다. 공동 임대인은 쉼표로 구분해 반환합니다.
+    """
+    cache_key = sha256_of_text(contract_text)
+    with _LANDLORD_NAME_CACHE_LOCK:
+        if cache_key in LANDLORD_NAME_CACHE:
+            LANDLORD_NAME_CACHE.move_to_end(cache_key)
+            print(f"  [임대인 검사] 캐시 적중: '{LANDLORD_NAME_CACHE[cache_key]}'")
+            return LANDLORD_NAME_CACHE[cache_key]
+
+    names, confidence = extract_landlord_names_by_rules(contract_text)
+    if names and confidence >= LANDLORD_RULE_MIN_CONFIDENCE:
+        landlord_name = ", ".join(names)
+        print(f"  [임대인 검사] 규칙 기반 추출 성공: '{landlord_name}' (신뢰도 {confidence:.2f}, LLM 호출 생략)")
+    else:
+        if names:
+            print(f"  [임대인 검사] 규칙 기반 추출 신뢰도 낮음 ({confidence:.2f}), LLM으로 확인합니다.")
+        landlord_name = extract_landlord_name_with_llm(contract_text)
+
+    if landlord_name != "이름 자동 추출 실패":
+        with _LANDLORD_NAME_CACHE_LOCK:
+            LANDLORD_NAME_CACHE[cache_key] = landlord_name
+            LANDLORD_NAME_CACHE.move_to_end(cache_key)
+            while len(LANDLORD_NAME_CACHE) > LANDLORD_NAME_CACHE_SIZE:
+                LANDLORD_NAME_CACHE.popitem(last=False)
+    return landlord_name
+
+def extract_landlord_name_with_llm(contract_text: str) -> str:
+    """🔥 3단계에 걸쳐 임대인 이름을 집요하게 추출하는 함수 (Gradio용 수정)"""
+    # --- 1단계: 이름만 정확히 추출 시도 ---
+    chain_step1 = get_chain("landlord_name")
     name_step1 = chain_step1.invoke({"contract": contract_text}).strip()
 
-    # 1단계 검증: 2~5글자의 한글 이름인지 확인
-    if re.fullmatch(r'[가-힣]{2,5}', name_step1.replace(" ", "")):
+    # 1단계 검증: 2~5글자의 한글 이름(공동 임대인은 쉼표 구분)인지 확인
+    names_step1 = [n.replace(" ", "") for n in name_step1.split(",")]
+    if all(re.fullmatch(r'[가-힣]{2,5}', n) for n in names_step1):
         print(f"  [임대인 검사] 1단계 성공: '{name_step1}' 추출")
-        return name_step1.replace(" ", "")
+        return ", ".join(names_step1)
 
     # --- 2단계: 실패 시, 문장 단위로 추출 후 파이썬으로 이름 찾기 ---
     print("  [임대인 검사] 1단계 실패, 2단계 시도 중...")
-    prompt_step2 = ChatPromptTemplate.from_template(
-        "다음 계약서 텍스트에서 '임대인' 또는 '집주인'의 이름이 포함된 라인 또는 문장 전체를 그대로 알려줘. "
-        "텍스트: {contract}"
-    )
-    chain_step2 = prompt_step2 | llm | StrOutputParser()
+    chain_step2 = get_chain("landlord_sentence")
     sentence = chain_step2.invoke({"contract": contract_text})
     
     # 2단계 검증: 문장에서 2~5글자 한글 패턴 찾기
@@ -1835,6 +2875,19 @@ def render_report_html(file_name: str, rule_analysis: dict, ai_analysis: dict, t
         
     alerts_html = "\n".join(alerts_html) if alerts_html else '<div class="alert">표시할 알림이 없습니다.</div>'
 
+    # 규칙 기반 검사에서 찾은 조항 위치를 하이라이트해 보여줍니다.
+    highlight_items = []
+    for cat_name, snippets in rule_analysis.get("highlights", {}).items():
+        display_name = cat_name.replace('_', ' ')
+        for before, matched, after in snippets:
+            highlight_items.append(
+                f'<li><b>{html_escape(display_name)}</b>: …{html_escape(before)}<mark>{html_escape(matched)}</mark>{html_escape(after)}…</li>'
+            )
+    highlights_html = (
+        f'<details class="clause-highlights"><summary>🔎 감지된 조항 위치 ({len(highlight_items)})</summary><ul>{"".join(highlight_items)}</ul></details>'
+        if highlight_items else ""
+    )
+
     ai_block = md_to_html(ai_analysis.get("analysis", ""))
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M")
 
@@ -1858,6 +2911,7 @@ def render_report_html(file_name: str, rule_analysis: dict, ai_analysis: dict, t
             <section class="report-section">
               <h2>계약서 안전도 검사</h2>
               <div class="alerts">{alerts_html}</div>
+              {highlights_html}
             </section>
 
             <section class="report-section">
@@ -1914,19 +2968,36 @@ def split_text_for_analysis(text: str, max_tokens: int = 3500) -> list:
     
     return chunks
 
-def perform_ai_analysis(contract_text: str) -> dict:
-    """RAG를 사용하여 계약서를 심층 분석합니다. (토큰 제한 자동 처리)"""
-    # RAG 검색기(RETRIEVER)가 준비되었는지 확인
-    if not RETRIEVER:
-        return {"analysis": "⚠️ AI 분석 엔진(RAG)이 초기화되지 않았습니다. 프로그램을 다시 시작하거나 설정을 확인해주세요."}
-    
-    try:
-        # 1) Groundedness Check 객체 생성
-        groundedness_checker = UpstageGroundednessCheck()
+# LLM 호출 간격 제어 (모든 스레드가 공유하는 다음 호출 가능 시각)
+LLM_RATE_LIMIT_STATE = {"next_slot": 0.0}
+_LLM_RATE_LIMIT_LOCK = threading.Lock()
 
-        # 2) 프롬프트 정의 (간소화된 버전)
-        prompt = ChatPromptTemplate.from_template(
-            """당신은 한국 부동산 법률 전문가입니다. 주어진 [참고 자료]를 바탕으로 다음 [계약서]를 분석하고, 임차인에게 불리하거나 누락된 조항이 없는지 상세히 설명해주세요. 답변은 마크다운 형식으로 명확하게 정리해주세요.
+def acquire_llm_rate_slot():
+    """LLM_REQUESTS_PER_MINUTE 한도를 넘지 않도록 다음 호출 순서가 올 때까지 기다립니다."""
+    if LLM_REQUESTS_PER_MINUTE <= 0:
+        return
+    interval = 60.0 / LLM_REQUESTS_PER_MINUTE
+    with _LLM_RATE_LIMIT_LOCK:
+        now = time.monotonic()
+        slot = max(now, LLM_RATE_LIMIT_STATE["next_slot"])
+        LLM_RATE_LIMIT_STATE["next_slot"] = slot + interval
+    if slot > now:
+        time.sleep(slot - now)
+
+# 프롬프트 템플릿 (체인 레지스트리에서 이름으로 찾아 시작 시 한 번만 컴파일합니다)
+LANDLORD_NAME_PROMPT = (
+    "다음 계약서 텍스트에서 '임대인' 또는 '집주인'의 이름만 정확하게 추출해줘. "
+    "다른 말은 모두 제외하고 이름만 말해줘. (예: 홍길동). "
+    "임대인이 여러 명이면 쉼표로 구분해서 모두 말해줘. (예: 홍길동, 김철수). "
+    "만약 이름이 없으면 '없음'이라고 말해줘. 텍스트: {contract}"
+)
+
+LANDLORD_SENTENCE_PROMPT = (
+    "다음 계약서 텍스트에서 '임대인' 또는 '집주인'의 이름이 포함된 라인 또는 문장 전체를 그대로 알려줘. "
+    "텍스트: {contract}"
+)
+
+CONTRACT_RAG_PROMPT = """당신은 한국 부동산 법률 전문가입니다. 주어진 [참고 자료]를 바탕으로 다음 [계약서]를 분석하고, 임차인에게 불리하거나 누락된 조항이 없는지 상세히 설명해주세요. 답변은 마크다운 형식으로 명확하게 정리해주세요.
 
 [참고 자료]
 {context}
@@ -1940,30 +3011,333 @@ def perform_ai_analysis(contract_text: str) -> dict:
 3. **개선 방안 및 대안 제시**: 발견된 문제점에 대해 구체적으로 어떻게 수정하거나 추가하면 좋을지 대안을 제시해주세요.
 4. **종합적인 법률 자문**: 계약 전반에 대한 종합적인 의견과 추가적으로 확인해야 할 사항을 알려주세요.
 """
-        )
 
-        # 3) context 텍스트화 유틸
-        def docs_to_text(docs):
+CONTRACT_SIMPLE_PROMPT = """한국 부동산 법률 전문가로서 다음 [계약서]를 분석해주세요.
+
+[계약서]
+{contract}
+
+다음 사항들을 중점적으로, 임차인의 입장에서 이해하기 쉽게 마크다운 형식으로 항목을 나누어 분석해주세요:
+1. **임차인에게 불리한 조항**: 독소 조항이나 일반적으로 임차인에게 불리하게 작용할 수 있는 내용을 짚어주세요.
+2. **누락된 중요 조항**: 임차인 보호를 위해 반드시 포함되어야 하지만 빠져 있는 조항이 있는지 확인해주세요.
+3. **개선 방안 및 대안 제시**: 발견된 문제점에 대해 구체적으로 어떻게 수정하거나 추가하면 좋을지 대안을 제시해주세요.
+4. **종합적인 법률 자문**: 계약 전반에 대한 종합적인 의견과 추가적으로 확인해야 할 사항을 알려주세요.
+"""
+
+CHAT_PROMPT = """당신은 한국 부동산 법률 전문가입니다. 주어진 [참고 자료]를 바탕으로 사용자의 [질문]에 대해 친절하고 상세하게 답변해주세요. 답변은 마크다운 형식으로 명확하게 정리해주세요. 법적 효력이 없음을 명시하고 전문가 상담을 권유하는 내용을 포함해주세요. 답변은 곧바로 핵심 내용부터 시작하고, RAG/참고 자료를 언급하는 서문이나 메타 문구(예: '주어진 [참고 자료]와 관련 법률을 바탕으로 답변드립니다')는 절대 포함하지 마세요. 각 핵심 주장마다 관련 [참고 자료]나 조문/문구를 한두 문장으로 간략히 인용하고 따옴표로 표시하세요.
+
+[참고 자료]
+{context}
+
+[질문]
+{question}
+"""
+
+TRANSLATION_SEGMENTS_PROMPT = """
+당신은 한국 부동산 법률 전문 번역가입니다. 아래 [번역할 블록]의 각 블록을 {target_language}로 번역해주세요.
+
+**CRITICAL 블록 표시 규칙:**
+- 각 블록은 [[번호]] 한 줄로 시작합니다. 같은 [[번호]] 줄을 그대로 쓰고, 그 아래에 해당 블록의 번역만 적으세요
+- 블록을 합치거나 나누거나 빠뜨리지 말고, [[번호]] 줄은 번역하지 마세요
+
+**번역 지침:**
+1. 볼드/이탤릭 (**text**, *text*), 링크, `코드` 표시는 그대로 유지
+2. 부동산 법률 전문용어는 정확하고 자연스럽게 번역하고, [앞부분 원문]과 같은 용어는 같은 번역어를 사용
+3. {style_guide}로 번역
+
+**[앞부분 원문] (문맥 참고용, 번역 결과에 포함하지 마세요):**
+{context_before}
+
+**[번역할 블록]:**
+{segments}
+
+**번역 결과 (블록 표시 규칙 엄격히 준수):**
+"""
+
+TRANSLATION_CELLS_PROMPT = """
+당신은 한국 부동산 법률 전문 번역가입니다. 아래 JSON 배열은 계약서 분석 보고서의 표 셀 문구들입니다.
+각 문자열을 {target_language}로 번역해 같은 길이·같은 순서의 JSON 문자열 배열만 출력하세요. 설명이나 다른 텍스트는 쓰지 마세요.
+- 볼드/이탤릭 (**text**), `코드` 표시와 숫자·금액·날짜는 그대로 유지
+- {style_guide}로 번역
+
+{cells}
+"""
+
+CHUNK_ANALYSIS_PROMPT = """한국 부동산 법률 전문가로서 전체 계약서 중 일부인 다음 [계약서 부분 {index}/{total}]을 임차인의 입장에서 검토해주세요.
+
+[계약서 부분 {index}/{total}]
+{contract}
+
+이 부분에서 발견한 내용만 아래 항목별로 간결한 글머리표로 적어주세요. 각 항목에는 근거가 되는 조항 번호나 문구를 함께 적고, 해당 내용이 없으면 "없음"이라고 적어주세요.
+1. 임차인에게 불리한 조항
+2. 누락되었을 수 있는 중요 조항 (다른 부분에 있을 수 있으므로 이 부분에서 확인되지 않는 것만)
+3. 개선 방안 및 대안
+4. 추가로 확인해야 할 사항
+"""
+
+REDUCE_ANALYSIS_PROMPT = """당신은 한국 부동산 법률 전문가입니다. 아래 [부분별 검토 결과]는 하나의 계약서를 {total}개 부분으로 나누어 각각 검토한 내용입니다.
+이를 하나의 최종 분석 보고서로 통합해주세요.
+
+- 여러 부분에서 반복된 지적은 한 번만 적고, 근거 조항을 모두 함께 표시해주세요.
+- 어떤 부분에서 "누락"으로 지적했더라도 다른 부분에서 해당 조항이 확인되면 누락으로 적지 마세요.
+- "부분 1", "청크" 같은 분할 정보는 보고서에 드러내지 마세요.
+
+[부분별 검토 결과]
+{analyses}
+
+다음 구성으로 임차인이 이해하기 쉽게 마크다운 형식으로 작성해주세요:
+1. **임차인에게 불리한 조항**
+2. **누락된 중요 조항**
+3. **개선 방안 및 대안 제시**
+4. **종합적인 법률 자문**
+"""
+
+# 체인 레지스트리: 프롬프트 이름 → (템플릿, 기본 모델, 기본 추론 강도)
+PROMPT_REGISTRY = {
+    "landlord_name": (LANDLORD_NAME_PROMPT, None, None),
+    "landlord_sentence": (LANDLORD_SENTENCE_PROMPT, None, None),
+    "contract_rag": (CONTRACT_RAG_PROMPT, "solar-pro2", "high"),
+    "contract_simple": (CONTRACT_SIMPLE_PROMPT, "solar-pro2", "high"),
+    "contract_chunk": (CHUNK_ANALYSIS_PROMPT, "solar-pro2", "high"),
+    "contract_reduce": (REDUCE_ANALYSIS_PROMPT, "solar-pro2", "high"),
+    "chat": (CHAT_PROMPT, "solar-pro2", "high"),
+    "translation_segments": (TRANSLATION_SEGMENTS_PROMPT, "solar-pro2", "high"),
+    "translation_cells": (TRANSLATION_CELLS_PROMPT, "solar-pro2", None),
+}
+_USE_DEFAULT = object()
+LLM_REGISTRY = {}
+CHAIN_REGISTRY = {}
+GROUNDEDNESS_CHECKER = None
+_CHAIN_REGISTRY_LOCK = threading.Lock()
+
+def get_llm(model: str = "solar-pro2", reasoning_effort: str = None):
+    """(모델, 추론 강도)별 ChatUpstage 클라이언트를 한 번만 만들어 공유합니다. 모든 클라이언트는 keep-alive HTTP 연결 풀을 함께 씁니다."""
+    key = (model, reasoning_effort)
+    with _CHAIN_REGISTRY_LOCK:
+        llm = LLM_REGISTRY.get(key)
+        if llm is None:
+            kwargs = {"http_client": UPSTAGE_HTTP_CLIENT}
+            if model:
+                kwargs["model"] = model
+            if reasoning_effort:
+                kwargs["reasoning_effort"] = reasoning_effort
+            llm = LLM_REGISTRY[key] = ChatUpstage(**kwargs)
+        return llm
+
+def get_chain(name: str, model=_USE_DEFAULT, reasoning_effort=_USE_DEFAULT):
+    """
+    이름으로 등록된 '프롬프트 | LLM | 문자열 파서' 체인을 반환합니다. (모델, 추론 강도)별로 한 번만 만들어 재사용합니다.
+    번역 대상 언어 등은 프롬프트 변수로 넘기므로 언어마다 체인을 따로 만들지 않습니다.
+    """
+    template, default_model, default_effort = PROMPT_REGISTRY[name]
+    model = default_model if model is _USE_DEFAULT else model
+    reasoning_effort = default_effort if reasoning_effort is _USE_DEFAULT else reasoning_effort
+    key = (name, model, reasoning_effort)
+    chain = CHAIN_REGISTRY.get(key)
+    if chain is None:
+        llm = get_llm(model, reasoning_effort)
+        with _CHAIN_REGISTRY_LOCK:
+            chain = CHAIN_REGISTRY.get(key)
+            if chain is None:
+                chain = CHAIN_REGISTRY[key] = ChatPromptTemplate.from_template(template) | llm | StrOutputParser()
+    return chain
+
+def get_groundedness_checker():
+    """UpstageGroundednessCheck 객체를 한 번만 만들어 백그라운드 검사에서 공유합니다."""
+    global GROUNDEDNESS_CHECKER
+    with _CHAIN_REGISTRY_LOCK:
+        if GROUNDEDNESS_CHECKER is None:
+            GROUNDEDNESS_CHECKER = UpstageGroundednessCheck()
+        return GROUNDEDNESS_CHECKER
+
+def warm_up_chains():
+    """등록된 모든 체인을 시작 시 미리 만들어 첫 요청의 준비 시간을 없앱니다."""
+    try:
+        for name in PROMPT_REGISTRY:
+            get_chain(name)
+        get_groundedness_checker()
+        print(f"✅ LLM 체인 {len(CHAIN_REGISTRY)}개 준비 완료 (클라이언트 {len(LLM_REGISTRY)}개)")
+    except Exception as e:
+        print(f"⚠️ LLM 체인 미리 준비 실패 (요청 시 다시 시도합니다): {e}")
+
+def stream_map_reduce_contract_analysis(text_chunks: list):
+    """
+    계약서 청크를 LLM_EXECUTOR에서 동시에 분석(map)한 뒤, 한 번의 LLM 호출로 중복을 합친 단일 보고서를 만듭니다(reduce).
+    통합 보고서는 생성되는 대로 지금까지의 전체 텍스트를 내보냅니다. (제너레이터)
+    실패한 청크는 한 번 재시도하고, 그래도 실패하면 자리표시 문구를 남긴 채 통합한 뒤 보고서 끝에 누락 경고를 붙입니다.
+    통합 단계가 실패하면 청크 결과를 순서대로 이어 붙여 내보냅니다.
+    """
+    total = len(text_chunks)
+    map_chain = get_chain("contract_chunk")
+
+    def analyze_chunk(index, chunk):
+        for attempt in range(2):
+            acquire_llm_rate_slot()
             try:
-                return "\n\n---\n\n".join(getattr(d, "page_content", str(d)) for d in docs)
-            except Exception:
-                return str(docs)
-
-        # 4) 답변 생성 체인 (출력에 근거 인용 유도)
-        chain = (
-            {
-                "context": RETRIEVER | RunnableLambda(docs_to_text),
-                "contract": RunnablePassthrough()
-            }
-            | prompt
-            | ChatUpstage(model="solar-pro2", reasoning_effort="high")
-            | StrOutputParser()
+                return map_chain.invoke({"contract": chunk, "index": index, "total": total})
+            except Exception as e:
+                if attempt:
+                    raise
+                print(f"⚠️ 청크 {index}/{total} 분석 실패, 재시도합니다: {e}")
+
+    started = time.perf_counter()
+    futures = [LLM_EXECUTOR.submit(analyze_chunk, i, chunk) for i, chunk in enumerate(text_chunks, 1)]
+    partial_analyses, failed_chunks = [], []
+    for i, future in enumerate(futures, 1):
+        try:
+            partial_analyses.append(future.result())
+            print(f"   ✅ 청크 {i}/{total} 분석 완료")
+        except Exception as e:
+            print(f"⚠️ 청크 {i}/{total} 분석 실패: {e}")
+            failed_chunks.append(i)
+            partial_analyses.append(f"(청크 {i} 분석 실패: 이 부분은 검토되지 않았습니다.)")
+    print(f"📋 청크 분석 {total - len(failed_chunks)}/{total}개 완료 ({time.perf_counter() - started:.1f}초)")
+
+    if len(failed_chunks) == total:
+        raise RuntimeError("모든 청크 분석에 실패했습니다.")
+    # 분석하지 못한 부분이 있으면 보고서 끝에 눈에 띄게 알립니다. (통합 보고서가 전체를 다룬 것처럼 보이지 않도록)
+    missing_note = ""
+    if failed_chunks:
+        missing_note = (
+            f"\n\n> ⚠️ **일부 분석 누락**: 계약서를 {total}개 부분으로 나눠 분석하던 중 "
+            f"{', '.join(map(str, failed_chunks))}번째 부분의 AI 분석에 실패했습니다. "
+            "해당 부분의 조항은 이 보고서에 반영되지 않았으니 직접 확인해주세요."
         )
+    if total == 1:
+        yield partial_analyses[0]
+        return
+
+    analyses_text = "\n\n---\n\n".join(f"[부분 {i}]\n{a}" for i, a in enumerate(partial_analyses, 1))
+    reduce_chain = get_chain("contract_reduce")
+    try:
+        acquire_llm_rate_slot()
+        report = ""
+        for token in reduce_chain.stream({"analyses": analyses_text, "total": total}):
+            report += token
+            yield report
+        if missing_note:
+            yield report + missing_note
+    except Exception as e:
+        print(f"⚠️ 분석 결과 통합 실패, 부분별 결과를 그대로 사용합니다: {e}")
+        yield "\n\n---\n\n".join(partial_analyses) + missing_note
+
+# 백그라운드 Groundedness Check 결과 (최근 결과는 메모리, 전체 기록은 GROUNDEDNESS_LOG_PATH)
+GROUNDEDNESS_STATS = {"submitted": 0, "sampled_out": 0, "grounded": 0, "not_grounded": 0, "errors": 0}
+GROUNDEDNESS_RECENT = deque(maxlen=200)
+_GROUNDEDNESS_LOCK = threading.Lock()
+
+def parse_groundedness_result(groundedness_result) -> tuple:
+    """UpstageGroundednessCheck 결과(dict, 객체, 문자열)에서 (점수, 이유)를 꺼냅니다."""
+    if isinstance(groundedness_result, dict):
+        score = groundedness_result.get("binary_score") or groundedness_result.get("score") or groundedness_result.get("result")
+        reason = groundedness_result.get("reason") or groundedness_result.get("explanation")
+    else:
+        # 객체나 문자열 등 다양한 형태 방어적 처리
+        score = getattr(groundedness_result, "binary_score", str(groundedness_result))
+        reason = getattr(groundedness_result, "reason", "")
+    return str(score).strip(), reason or ""
+
+def run_groundedness_check(kind: str, context: str, answer: str, on_result=None):
+    """
+    Groundedness Check를 실행하고 결과를 터미널, 최근 결과 목록, 기록 파일에 남깁니다. (백그라운드 작업)
+    on_result가 주어지면 검사가 끝난 뒤 점수 문자열(실패 시 None)로 호출합니다.
+    """
+    label = "🕵️  [계약서 분석]" if kind == "analysis" else "💬 [실시간 상담]"
+    record = {"kind": kind, "checked_at": datetime.now().isoformat(timespec="seconds"),
+              "context_chars": len(context), "answer_chars": len(answer)}
+    started = time.perf_counter()
+    try:
+        groundedness_result = get_groundedness_checker().invoke({"context": context, "answer": answer})
+        score, reason = parse_groundedness_result(groundedness_result)
+        record.update({"score": score, "reason": reason})
+    except Exception as e:
+        print(f"⚠️ {label} Groundedness Check 실패: {e}")
+        record.update({"score": None, "error": str(e)})
+    record["elapsed_sec"] = round(time.perf_counter() - started, 2)
+
+    if record["score"] is not None:
+        print("\n" + "="*50)
+        print(f"{label} Groundedness Check 결과 (터미널 전용)")
+        print(f" - 사실 기반 점수: {record['score']} ({'근거 있음' if record['score'].lower() == 'grounded' else '근거 없음'})")
+        if record["reason"]:
+            print(f" - 이유: {record['reason']}")
+        print("="*50 + "\n")
+
+    with _GROUNDEDNESS_LOCK:
+        if record["score"] is None:
+            GROUNDEDNESS_STATS["errors"] += 1
+        elif record["score"].lower() == "grounded":
+            GROUNDEDNESS_STATS["grounded"] += 1
+        else:
+            GROUNDEDNESS_STATS["not_grounded"] += 1
+        GROUNDEDNESS_RECENT.append(record)
+        completed = GROUNDEDNESS_STATS["grounded"] + GROUNDEDNESS_STATS["not_grounded"] + GROUNDEDNESS_STATS["errors"]
+        try:
+            GROUNDEDNESS_LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
+            # 기록 파일이 GROUNDEDNESS_LOG_MAX_BYTES를 넘으면 .1로 넘기고 새 파일에 이어서 기록 (이전 .1은 덮어씀)
+            if GROUNDEDNESS_LOG_PATH.exists() and GROUNDEDNESS_LOG_PATH.stat().st_size >= GROUNDEDNESS_LOG_MAX_BYTES:
+                os.replace(GROUNDEDNESS_LOG_PATH, GROUNDEDNESS_LOG_PATH.with_name(GROUNDEDNESS_LOG_PATH.name + ".1"))
+            with open(GROUNDEDNESS_LOG_PATH, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"⚠️ Groundedness 결과 기록 실패: {e}")
+
+    if completed % GROUNDEDNESS_SUMMARY_EVERY == 0:
+        print(format_groundedness_summary(get_groundedness_summary()))
+
+    if on_result is not None:
+        try:
+            on_result(record["score"])
+        except Exception as e:
+            print(f"⚠️ Groundedness 결과 처리 실패: {e}")
+
+def submit_groundedness_check(kind: str, context: str, answer: str, on_result=None) -> bool:
+    """
+    응답을 돌려준 뒤 Groundedness Check가 실행되도록 GROUNDEDNESS_EXECUTOR에 넘깁니다.
+    GROUNDEDNESS_SAMPLE_RATE 비율만큼만 검사하며, 검사 대상이면 True를 반환합니다.
+    """
+    if not answer or random.random() >= GROUNDEDNESS_SAMPLE_RATE:
+        with _GROUNDEDNESS_LOCK:
+            GROUNDEDNESS_STATS["sampled_out"] += 1
+        return False
+    with _GROUNDEDNESS_LOCK:
+        GROUNDEDNESS_STATS["submitted"] += 1
+    GROUNDEDNESS_EXECUTOR.submit(run_groundedness_check, kind, context, answer, on_result)
+    return True
+
+def get_groundedness_summary(recent: int = 20) -> dict:
+    """누적 Groundedness 통계와 최근 검사 결과를 반환합니다."""
+    with _GROUNDEDNESS_LOCK:
+        return {"stats": dict(GROUNDEDNESS_STATS), "recent": list(GROUNDEDNESS_RECENT)[-recent:]}
+
+def format_groundedness_summary(summary: dict) -> str:
+    """get_groundedness_summary() 결과를 터미널용 한 줄 요약으로 만듭니다."""
+    stats = summary["stats"]
+    checked = stats["grounded"] + stats["not_grounded"]
+    ratio = f"{stats['grounded'] / checked:.0%}" if checked else "-"
+    recent_flagged = sum(1 for record in summary["recent"] if record.get("score") and record["score"].lower() != "grounded")
+    return (f"📊 Groundedness 누적: 근거 있음 {stats['grounded']}/{checked}건 ({ratio}), 실패 {stats['errors']}건, "
+            f"표본 제외 {stats['sampled_out']}건 | 최근 {len(summary['recent'])}건 중 근거 없음 {recent_flagged}건")
+
+def stream_ai_analysis(contract_text: str):
+    """
+    RAG를 사용하여 계약서를 심층 분석합니다. (토큰 제한 자동 처리, 제너레이터)
+    분석 결과가 생성되는 대로 지금까지의 전체 마크다운을 내보내며, 마지막 값이 최종 결과입니다.
+    """
+    # RAG 검색기(RETRIEVER)가 준비되었는지 확인
+    if not RETRIEVER:
+        yield "⚠️ AI 분석 엔진(RAG)이 초기화되지 않았습니다. 프로그램을 다시 시작하거나 설정을 확인해주세요."
+        return
+    
+    try:
+        # 1) 답변 생성 체인 (출력에 근거 인용 유도, 시작 시 한 번 만든 체인을 재사용)
+        chain = get_chain("contract_rag")
 
-        # 5) 토큰 제한 확인 및 텍스트 분할
+        # 2) 토큰 제한 확인 및 텍스트 분할
         estimated_tokens = len(contract_text) // 4
         print(f"📊 계약서 토큰 수: 약 {estimated_tokens} 토큰")
         
+        analysis_result = ""
         # RAG 검색 결과의 토큰 수도 고려하여 더 낮은 임계값 사용
         if estimated_tokens > 2000:  # RAG context를 고려하여 2000으로 낮춤
             print(f"⚠️ 토큰 수 초과 감지: 약 {estimated_tokens} 토큰 (제한: 4000)")
@@ -1973,143 +3347,42 @@ def perform_ai_analysis(contract_text: str) -> dict:
             text_chunks = split_text_for_analysis(contract_text, max_tokens=2000)
             print(f"📋 총 {len(text_chunks)}개 청크로 분할 완료")
             
-            # 각 청크별로 분석 수행
-            all_analyses = []
-            for i, chunk in enumerate(text_chunks, 1):
-                print(f"🔍 청크 {i}/{len(text_chunks)} 분석 중...")
-                print(f"   📏 청크 {i} 길이: {len(chunk)} 문자 (약 {len(chunk)//4} 토큰)")
-                print(f"   📝 청크 {i} 시작 부분: {chunk[:100]}...")
-                
-                try:
-                    # RAG 체인 대신 단순 분석 사용
-                    print(f"   🤖 청크 {i} 단순 분석 시작...")
-                    simple_prompt = ChatPromptTemplate.from_template(
-                        """한국 부동산 법률 전문가로서 다음 [계약서]를 분석해주세요.
-
-[계약서]
-{contract}
-
-다음 사항들을 중점적으로, 임차인의 입장에서 이해하기 쉽게 마크다운 형식으로 항목을 나누어 분석해주세요:
-1. **임차인에게 불리한 조항**: 독소 조항이나 일반적으로 임차인에게 불리하게 작용할 수 있는 내용을 짚어주세요.
-2. **누락된 중요 조항**: 임차인 보호를 위해 반드시 포함되어야 하지만 빠져 있는 조항이 있는지 확인해주세요.
-3. **개선 방안 및 대안 제시**: 발견된 문제점에 대해 구체적으로 어떻게 수정하거나 추가하면 좋을지 대안을 제시해주세요.
-4. **종합적인 법률 자문**: 계약 전반에 대한 종합적인 의견과 추가적으로 확인해야 할 사항을 알려주세요.
-"""
-                    )
-                    print(f"   📋 청크 {i} 프롬프트 생성 완료")
-                    
-                    simple_chain = simple_prompt | ChatUpstage(model="solar-pro2", reasoning_effort="high") | StrOutputParser()
-                    print(f"   🔗 청크 {i} 체인 생성 완료, 분석 실행 중...")
-                    
-                    chunk_result = simple_chain.invoke({"contract": chunk})
-                    print(f"   ✅ 청크 {i} 분석 성공! 결과 길이: {len(chunk_result)} 문자")
-                    
-                    # 청크가 1개일 때는 제목을 표시하지 않음
-                    if len(text_chunks) == 1:
-                        all_analyses.append(chunk_result)
-                        print(f"   📌 청크 {i} 결과 저장 (제목 없음)")
-                    else:
-                        all_analyses.append(f"## 청크 {i} 분석 결과\n\n{chunk_result}")
-                        print(f"   📌 청크 {i} 결과 저장 (제목 포함)")
-                        
-                except Exception as chunk_error:
-                    print(f"⚠️ 청크 {i} 분석 실패: {chunk_error}")
-                    print(f"   🔍 오류 타입: {type(chunk_error).__name__}")
-                    print(f"   📋 오류 상세: {str(chunk_error)}")
-                    
-                    if len(text_chunks) == 1:
-                        all_analyses.append(f"분석 실패\n\n오류: {chunk_error}")
-                        print(f"   📌 청크 {i} 실패 결과 저장 (제목 없음)")
-                    else:
-                        all_analyses.append(f"## 청크 {i} 분석 실패\n\n오류: {chunk_error}")
-                        print(f"   📌 청크 {i} 실패 결과 저장 (제목 포함)")
-            
-            # 모든 분석 결과 통합
-            print(f"📊 분석 결과 통합 시작... (총 {len(all_analyses)}개)")
-            if len(text_chunks) == 1:
-                analysis_result = all_analyses[0]
-                print(f"   📌 단일 청크 결과 사용 (길이: {len(analysis_result)} 문자)")
-            else:
-                analysis_result = "\n\n---\n\n".join(all_analyses)
-                print(f"   📌 다중 청크 결과 통합 (길이: {len(analysis_result)} 문자)")
-            print("✅ 모든 청크 분석 완료 및 통합")
+            # 청크를 동시에 분석한 뒤 하나의 보고서로 통합
+            for analysis_result in stream_map_reduce_contract_analysis(text_chunks):
+                yield analysis_result
+            print(f"✅ 청크 분석 및 통합 완료 (길이: {len(analysis_result)} 문자)")
             
-            # Groundedness Check는 전체 텍스트에 대해 수행
-            print(f"🔍 Groundedness Check 시작... (텍스트 길이: {len(contract_text)} 문자)")
-            try:
-                print(f"   📋 Groundedness Check 입력 준비 중...")
-                # UpstageGroundednessCheckInput 형식에 맞게 입력 준비
-                groundedness_input = {
-                    "context": contract_text,  # 원본 계약서 텍스트
-                    "answer": analysis_result   # AI 분석 결과
-                }
-                print(f"   📋 입력 형식: context={len(contract_text)}자, answer={len(analysis_result)}자")
-                
-                groundedness_result = groundedness_checker.invoke(groundedness_input)
-                print(f"   ✅ Groundedness Check 성공!")
-                print(f"   📊 결과 타입: {type(groundedness_result)}")
-                if isinstance(groundedness_result, dict):
-                    print(f"   📋 결과 키: {list(groundedness_result.keys())}")
-            except Exception as ge:
-                print(f"⚠️ Groundedness Check 실패: {ge}")
-                print(f"   🔍 오류 타입: {type(ge).__name__}")
-                print(f"   📋 오류 상세: {str(ge)}")
-                groundedness_result = None
+            # Groundedness Check는 전체 텍스트에 대해 응답 후 백그라운드에서 수행
+            submit_groundedness_check("analysis", contract_text, analysis_result)
         else:
             # 일반적인 분석 수행
             print(f"✅ 토큰 수 확인: 약 {estimated_tokens} 토큰 (제한 내)")
             
             try:
-                # RAG 답변과 Groundedness Check 병행 체인
-                rag_chain_with_check = RunnablePassthrough.assign(
-                    context=itemgetter("contract") | RunnableLambda(build_grounded_context_for_contract),
-                    answer=itemgetter("contract") | chain
-                ).assign(
-                    groundedness=groundedness_checker
+                # 참고 자료를 한 번 검색해 답변 프롬프트와 Groundedness 컨텍스트에 함께 사용
+                docs = retrieve_documents(contract_text)
+                for token in chain.stream({"context": docs_to_text(docs), "contract": contract_text}):
+                    analysis_result += token
+                    yield analysis_result
+                # Groundedness Check는 응답 후 백그라운드에서 수행
+                submit_groundedness_check(
+                    "analysis",
+                    build_grounded_context_for_contract(contract_text, docs),
+                    analysis_result
                 )
-
-                # 실행 및 결과 추출
-                result_dict = rag_chain_with_check.invoke({"contract": contract_text})
-                analysis_result = result_dict.get("answer", "")
-                groundedness_result = result_dict.get("groundedness", None)
             except Exception as e:
                 print(f"⚠️ RAG 분석 실패, 단순 분석으로 전환: {e}")
                 # RAG 실패 시 단순 분석으로 전환
-                simple_prompt = ChatPromptTemplate.from_template(
-                    """한국 부동산 법률 전문가로서 다음 [계약서]를 분석해주세요.
-
-[계약서]
-{contract}
-
-다음 사항들을 중점적으로, 임차인의 입장에서 이해하기 쉽게 마크다운 형식으로 항목을 나누어 분석해주세요:
-1. **임차인에게 불리한 조항**: 독소 조항이나 일반적으로 임차인에게 불리하게 작용할 수 있는 내용을 짚어주세요.
-2. **누락된 중요 조항**: 임차인 보호를 위해 반드시 포함되어야 하지만 빠져 있는 조항이 있는지 확인해주세요.
-3. **개선 방안 및 대안 제시**: 발견된 문제점에 대해 구체적으로 어떻게 수정하거나 추가하면 좋을지 대안을 제시해주세요.
-4. **종합적인 법률 자문**: 계약 전반에 대한 종합적인 의견과 추가적으로 확인해야 할 사항을 알려주세요.
-"""
-                )
-                simple_chain = simple_prompt | ChatUpstage(model="solar-pro2", reasoning_effort="high") | StrOutputParser()
-                analysis_result = simple_chain.invoke({"contract": contract_text})
-                groundedness_result = None
-
-        print("\n" + "="*50)
-        print("🕵️  [계약서 분석] Groundedness Check 결과 (터미널 전용)")
-        if isinstance(groundedness_result, dict):
-            score = groundedness_result.get("binary_score") or groundedness_result.get("score") or groundedness_result.get("result")
-            reason = groundedness_result.get("reason") or groundedness_result.get("explanation")
-        else:
-            # 객체나 문자열 등 다양한 형태 방어적 처리
-            score = getattr(groundedness_result, "binary_score", str(groundedness_result))
-            reason = getattr(groundedness_result, "reason", "")
-        print(f" - 사실 기반 점수: {score} ({'근거 있음' if str(score).lower().strip() == 'grounded' else '근거 없음'})")
-        if reason:
-            print(f" - 이유: {reason}")
-        print("="*50 + "\n")
-
-        return {"analysis": analysis_result}
+                simple_chain = get_chain("contract_simple")
+                analysis_result = ""
+                for token in simple_chain.stream({"contract": contract_text}):
+                    analysis_result += token
+                    yield analysis_result
+        if not analysis_result:
+            yield analysis_result
     except Exception as e:
-        print(f"❌ Groundedness Check 또는 AI 분석 중 오류: {e}")
-        return {"analysis": f"❌ AI 분석 중 오류 발생: {e}"}
+        print(f"❌ AI 분석 중 오류: {e}")
+        yield f"❌ AI 분석 중 오류 발생: {e}"
 
 def solar_translate_text(text, target_lang):
     """
@@ -2155,330 +3428,436 @@ def solar_translate_text(text, target_lang):
     config = lang_config[target_lang]
     
     try:
-        # 긴 텍스트인 경우 청크 단위로 분할하여 번역
-        if len(text) > 8000:  # 약 2000 토큰
-            return translate_long_text_with_solar(text, target_lang, config)
-        
-        # 마크다운 전처리 (번역 전 테이블 구조 보호)
-        preprocessed_text = preprocess_markdown_for_translation(text)
-        
-        # 일반 번역 수행
-        prompt = ChatPromptTemplate.from_template("""
-당신은 한국 부동산 법률 전문 번역가입니다. 다음 텍스트를 {target_language}로 번역해주세요.
-
-**CRITICAL 테이블 번역 규칙:**
-- 테이블의 각 행은 반드시 | 로 시작하고 | 로 끝나야 합니다
-- 컬럼 사이는 | 하나로만 구분합니다 (예: | 컬럼1 | 컬럼2 | 컬럼3 |)
-- 테이블 헤더 다음 줄은 반드시 구분선(예: | --- | --- | --- |)이어야 합니다
-- 셀 내용 번역 시 파이프(|) 문자를 절대 추가하지 마세요
-
-**마크다운 형식 보존 지침:**
-1. 헤딩 구조 (#, ##, ###) 정확히 유지
-2. 테이블 구조 (| 컬럼 |) 완벽 보존 - 가장 중요!
-3. 리스트 구조 (-, 1.) 들여쓰기 포함 유지  
-4. 볼드/이탤릭 (**text**, *text*) 정확히 유지
-5. 코드 블록 (```) 구조 유지
-6. 부동산 법률 전문용어는 정확하고 자연스럽게 번역
-7. {style_guide}로 번역
-
-**번역할 텍스트:**
-{text}
-
-**예시 테이블 형식:**
-| 헤더1 | 헤더2 | 헤더3 |
-| --- | --- | --- |
-| 내용1 | 내용2 | 내용3 |
-
-**번역 결과 (위 형식 엄격히 준수):**
-""")
-        
-        chain = prompt | ChatUpstage(model="solar-pro2", reasoning_effort="high") | StrOutputParser()
-        
-        result = chain.invoke({
-            "text": preprocessed_text,
-            "target_language": config["name"],
-            "instructions": config["instructions"], 
-            "style_guide": config["style"]
-        })
-        
-        # 번역 결과 후처리 - 마크다운 구조 복원
-        result = fix_markdown_structure(result, text)
-        
-        # HTML 주석 제거 (번역 지침 주석 정리)
-        result = re.sub(r'<!--.*?-->', '', result, flags=re.DOTALL)
-        result = re.sub(r'\n\s*\n\s*\n', '\n\n', result)  # 과도한 빈 줄 정리
-        
-        # 테이블 구조 검증 (디버깅용)
-        table_issues = validate_table_structure(result)
-        if table_issues:
-            print(f"⚠️ 번역 후 테이블 구조 문제 발견:")
-            for issue in table_issues[:3]:  # 최대 3개만 출력
-                print(f"   - {issue}")
-        else:
-            print("✅ 테이블 구조 검증 통과")
-        
-        return result.strip()
+        # 마크다운을 한 번 파싱해 번역할 텍스트 조각(헤딩/리스트/문단 텍스트)과 표 셀만 뽑고,
+        # 번역 메모리에 있는 것은 재사용하고 처음 보는 것만 번역한 뒤 같은 구조로 다시 직렬화합니다.
+        blocks = parse_markdown_blocks(text)
+        leaves = markdown_translation_leaves(blocks)
+
+        # 표 셀은 중복을 없앤 뒤 JSON 배열 한 번으로 따로 번역 (문단 번역과 동시에 진행)
+        cells = markdown_table_cells(blocks)
+        cell_translations = {}
+        for cell in cells:
+            cached = lookup_translation_memory(cell, target_lang, "translation_cells")
+            if cached is not None:
+                cell_translations[cell] = cached
+        pending_cells = [cell for cell in cells if cell not in cell_translations]
+        print(f"🧠 번역 메모리: 표 셀 {len(cells)}종 중 {len(cells) - len(pending_cells)}종 재사용, {len(pending_cells)}종 번역")
+        cells_future = LLM_EXECUTOR.submit(translate_table_cells_with_solar, pending_cells, config) if pending_cells else None
+        translations = [None] * len(leaves)
+        pending, hits = [], 0
+        for i, (_, segment) in enumerate(leaves):
+            translations[i] = lookup_translation_memory(segment, target_lang)
+            if translations[i] is None:
+                pending.append(i)
+            else:
+                hits += 1
+        print(f"🧠 번역 메모리: 텍스트 조각 {len(leaves)}개 중 {hits}개 재사용, {len(pending)}개 번역")
+
+        if pending:
+            translated = translate_segments_with_solar([leaves[i][1] for i in pending], config)
+            for i, translation in zip(pending, translated):
+                translations[i] = translation
+
+        stored = []
+        for i, ((block, segment), translation) in enumerate(zip(leaves, translations)):
+            # 끝내 실패한 조각은 원문을 유지하고 메모리에 저장하지 않음
+            if translation is not None:
+                apply_leaf_translation(block, translation)
+                if i in pending:
+                    stored.append((segment, translation))
+
+        if cells_future is not None:
+            translated_cells = cells_future.result()
+            cell_translations.update(translated_cells)
+            store_translation_memory(list(translated_cells.items()), target_lang, "translation_cells")
+        apply_table_cell_translations(blocks, cell_translations)
+        store_translation_memory(stored, target_lang)
+
+        return serialize_markdown_blocks(blocks).strip()
         
     except Exception as e:
         print(f"❌ Solar 번역 중 오류: {e}")
         return f"번역 오류: {e}\n\n원본 텍스트:\n{text[:500]}..."
 
-def translate_long_text_with_solar(text, target_lang, config):
-    """긴 텍스트를 청크 단위로 분할하여 Solar Pro2로 번역"""
-    try:
-        # 마크다운 구조를 고려한 청크 분할
-        chunks = split_text_for_translation(text)
-        translated_chunks = []
-        
-        for i, chunk in enumerate(chunks, 1):
-            print(f"🔄 번역 중... ({i}/{len(chunks)})")
-            
-            prompt = ChatPromptTemplate.from_template("""
-당신은 한국 부동산 법률 전문 번역가입니다. 다음 텍스트 청크를 {target_language}로 번역해주세요.
+TRANSLATION_SEGMENT_MARKER_RE = re.compile(r'^[ \t]*\[\[(\d+)\]\][ \t]*$', re.MULTILINE)
 
-**번역 지침:**
-- 마크다운 형식 완벽 보존 (헤딩 #, 테이블 |, 리스트 -, 볼드 **)
-- 부동산 법률 전문용어 정확성
-- {style_guide}
-- 청크 간 연결성 고려
+MARKDOWN_RULE_RE = re.compile(r'^\s*([-*_])(?:\s*\1){2,}\s*$')
+MARKDOWN_PREFIX_RE = re.compile(r'^(\s*(?:#{1,6}|[-*+]|\d+[.)]|>+)\s+)(.*)$')
+MARKDOWN_TABLE_SEPARATOR_RE = re.compile(r'^\s*\|?\s*:?-+:?\s*(?:\|\s*:?-+:?\s*)*\|?\s*$')
 
-**텍스트 청크 {chunk_num}/{total_chunks}:**
-{chunk_text}
+def split_table_row(line: str) -> list:
+    """표 한 줄을 셀 목록으로 나눕니다. (양 끝 파이프 제외, \\| 는 셀 내용으로 취급)"""
+    row = line.strip()
+    if row.startswith('|'):
+        row = row[1:]
+    if row.endswith('|') and not row.endswith('\\|'):
+        row = row[:-1]
+    return [cell.strip() for cell in re.split(r'(?<!\\)\|', row)]
 
-**번역 결과:**
-""")
-            
-            chain = prompt | ChatUpstage(model="solar-pro2") | StrOutputParser()
-            
-            chunk_result = chain.invoke({
-                "chunk_text": chunk,
-                "target_language": config["name"],
-                "style_guide": config["style"],
-                "chunk_num": i,
-                "total_chunks": len(chunks)
-            })
-            
-            translated_chunks.append(chunk_result.strip())
-        
-        # 청크들을 결합
-        final_result = "\n\n".join(translated_chunks)
-        
-        # 전체 구조 후처리
-        final_result = fix_markdown_structure(final_result, text)
-        
-        # HTML 주석 제거 (번역 지침 주석 정리)
-        final_result = re.sub(r'<!--.*?-->', '', final_result, flags=re.DOTALL)
-        final_result = re.sub(r'\n\s*\n\s*\n', '\n\n', final_result)  # 과도한 빈 줄 정리
-        
-        # 테이블 구조 검증 (긴 텍스트용)
-        table_issues = validate_table_structure(final_result)
-        if table_issues:
-            print(f"⚠️ 긴 텍스트 번역 후 테이블 구조 문제 발견:")
-            for issue in table_issues[:5]:  # 긴 텍스트는 최대 5개 출력
-                print(f"   - {issue}")
+def parse_markdown_blocks(text: str) -> list:
+    """
+    마크다운을 한 번 훑어 블록 목록으로 파싱합니다.
+    블록 종류: code/rule/blank(원문 그대로), line(헤딩·리스트·인용 접두사 + 텍스트), paragraph(들여쓰기 + 여러 줄 텍스트), table(셀 배열).
+    """
+    blocks = []
+    lines = text.split('\n')
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        stripped = line.strip()
+        if stripped.startswith('```'):
+            end = i + 1
+            while end < len(lines) and not lines[end].strip().startswith('```'):
+                end += 1
+            blocks.append({"type": "code", "raw": '\n'.join(lines[i:end + 1])})
+            i = end + 1
+            continue
+        if not stripped:
+            blocks.append({"type": "blank", "raw": ""})
+        elif MARKDOWN_RULE_RE.match(line):
+            blocks.append({"type": "rule", "raw": stripped})
+        elif stripped.startswith('|'):
+            rows = []
+            while i < len(lines) and lines[i].strip().startswith('|'):
+                rows.append(lines[i])
+                i += 1
+            table = {"type": "table", "align": None, "rows": [split_table_row(rows[0])]}
+            body = rows[1:]
+            if body and MARKDOWN_TABLE_SEPARATOR_RE.match(body[0]):
+                table["align"] = [cell.replace(' ', '') for cell in split_table_row(body[0])]
+                body = body[1:]
+            table["rows"].extend(split_table_row(row) for row in body)
+            blocks.append(table)
+            continue
         else:
-            print("✅ 긴 텍스트 테이블 구조 검증 통과")
-        
-        return final_result
-        
-    except Exception as e:
-        print(f"❌ 긴 텍스트 번역 중 오류: {e}")
-        return f"번역 오류: {e}\n\n원본 텍스트:\n{text[:500]}..."
+            match = MARKDOWN_PREFIX_RE.match(line)
+            if match:
+                blocks.append({"type": "line", "prefix": match.group(1), "text": match.group(2)})
+            elif blocks and blocks[-1]["type"] == "paragraph":
+                blocks[-1]["text"] += '\n' + stripped
+            else:
+                blocks.append({"type": "paragraph", "indent": line[:len(line) - len(line.lstrip())], "text": stripped})
+        i += 1
+    return blocks
 
-def split_text_for_translation(text, max_chars=6000):
-    """마크다운 구조를 고려하여 텍스트를 번역용으로 분할"""
-    if len(text) <= max_chars:
-        return [text]
-    
-    chunks = []
-    current_chunk = ""
-    
-    # 마크다운 블록 단위로 분할 (헤딩, 리스트, 테이블 등)
-    blocks = re.split(r'\n(?=#{1,6}\s|\|\s|\d+\.\s|\-\s|\*\s)', text)
-    
+def serialize_markdown_blocks(blocks: list) -> str:
+    """parse_markdown_blocks의 블록 목록을 마크다운으로 되돌립니다. 표는 열 수를 맞춰 항상 같은 형식으로 씁니다."""
+    lines = []
     for block in blocks:
-        if len(current_chunk + block) <= max_chars:
-            current_chunk += block + "\n"
+        kind = block["type"]
+        if kind == "line":
+            lines.append(block["prefix"] + block["text"])
+        elif kind == "paragraph":
+            lines.extend(block["indent"] + part for part in block["text"].split('\n'))
+        elif kind == "table":
+            width = max(len(row) for row in block["rows"])
+            rows = [row + [""] * (width - len(row)) for row in block["rows"]]
+            lines.append('| ' + ' | '.join(rows[0]) + ' |')
+            if block["align"] is not None:
+                align = block["align"] + ["---"] * (width - len(block["align"]))
+                lines.append('| ' + ' | '.join(align[:width]) + ' |')
+            lines.extend('| ' + ' | '.join(row) + ' |' for row in rows[1:])
         else:
-            if current_chunk.strip():
-                chunks.append(current_chunk.strip())
-            current_chunk = block + "\n"
-    
-    if current_chunk.strip():
-        chunks.append(current_chunk.strip())
-    
-    return chunks
+            lines.append(block["raw"])
+    return '\n'.join(lines)
+
+def markdown_translation_leaves(blocks: list) -> list:
+    """번역할 텍스트 조각을 (블록, 원문) 목록으로 모읍니다. 표는 셀 단위로 따로 번역하고, 한글이 없는 조각은 건너뜁니다."""
+    return [
+        (block, block["text"]) for block in blocks
+        if block["type"] in ("line", "paragraph") and is_translatable_segment(block["text"])
+    ]
 
-def fix_markdown_structure(translated_text, original_text):
-    """번역 후 깨진 마크다운 구조를 복원"""
-    
-    # 1. 테이블 구조 복원
-    translated_text = fix_table_structure(translated_text)
-    
-    # 2. 헤딩 구조 복원  
-    translated_text = fix_heading_structure(translated_text)
-    
-    # 3. 리스트 구조 복원
-    translated_text = fix_list_structure(translated_text)
-    
-    # 4. 볼드/이탤릭 복원
-    translated_text = fix_emphasis_structure(translated_text)
-    
-    return translated_text
+def apply_leaf_translation(block: dict, translation: str):
+    """번역된 조각을 블록에 넣습니다. 한 줄 블록은 한 줄로, 문단은 빈 줄 없이 정리합니다."""
+    if block["type"] == "line":
+        block["text"] = re.sub(r'\s*\n\s*', ' ', translation.strip())
+    else:
+        block["text"] = re.sub(r'\n\s*\n+', '\n', translation.strip())
 
-def fix_table_structure(text):
-    """테이블 구조 복원 - 강화된 버전"""
-    lines = text.split('\n')
-    fixed_lines = []
-    in_table = False
-    
-    for i, line in enumerate(lines):
-        stripped = line.strip()
-        
-        # 테이블 라인 감지 (파이프 포함하고 URL이 아닌 경우)
-        if '|' in stripped and not stripped.startswith('http'):
-            in_table = True
-            
-            # 테이블 구분선 처리 (---|---|--- 형태)
-            if re.match(r'^[\|\-\s]+$', stripped.replace(':', '')):
-                # 구분선 정규화
-                separator_parts = stripped.split('|')
-                clean_parts = []
-                for part in separator_parts:
-                    part = part.strip()
-                    if part == '' or re.match(r'^[\-\:]+$', part):
-                        if part and not re.match(r'^[\-\:]+$', part):
-                            clean_parts.append('---')
-                        elif part:
-                            clean_parts.append(part)
-                        else:
-                            clean_parts.append('')
-                    else:
-                        clean_parts.append('---')
-                
-                if clean_parts and (clean_parts[0] == '' or clean_parts[0] == '---'):
-                    if clean_parts[-1] == '' or clean_parts[-1] == '---':
-                        # 양쪽 끝이 비어있는 경우 (올바른 테이블 형태)
-                        fixed_line = '|' + '|'.join(clean_parts[1:-1]) + '|'
-                    else:
-                        # 끝에 파이프가 없는 경우
-                        fixed_line = '|' + '|'.join(clean_parts) + '|'
-                else:
-                    # 시작에 파이프가 없는 경우
-                    fixed_line = '|' + '|'.join(clean_parts) + '|'
-                    
-                fixed_lines.append(fixed_line)
-                continue
-            
-            # 일반 테이블 셀 처리
-            if '|' in stripped:
-                # 파이프로 분할하여 셀 정리
-                cells = stripped.split('|')
-                clean_cells = []
-                
-                for cell in cells:
-                    clean_cell = cell.strip()
-                    # 빈 셀도 유지 (테이블 구조를 위해)
-                    clean_cells.append(clean_cell)
-                
-                # 테이블 행 형태로 재구성
-                if not stripped.startswith('|'):
-                    # 시작 파이프 없음 - 첫 번째 요소를 셀로 취급
-                    fixed_line = '| ' + ' | '.join(clean_cells) + ' |'
-                elif not stripped.endswith('|'):
-                    # 끝 파이프 없음 - 마지막 요소까지 셀로 취급
-                    fixed_line = '| ' + ' | '.join(clean_cells) + ' |'
+def markdown_table_cells(blocks: list) -> list:
+    """모든 표에서 번역할 셀 문구를 중복 없이 처음 나온 순서대로 모읍니다. ("있음", "확인 필요" 등 반복 셀은 한 번만)"""
+    cells = {}
+    for block in blocks:
+        if block["type"] == "table":
+            for row in block["rows"]:
+                for cell in row:
+                    if cell and is_translatable_segment(cell):
+                        cells.setdefault(cell, None)
+    return list(cells)
+
+def apply_table_cell_translations(blocks: list, cell_translations: dict):
+    """번역된 셀 문구를 원래 표 격자에 다시 넣습니다. 번역이 없는 셀은 원문을 유지합니다."""
+    for block in blocks:
+        if block["type"] == "table":
+            block["rows"] = [[cell_translations.get(cell, cell) for cell in row] for row in block["rows"]]
+
+def parse_translated_cells(output: str, count: int):
+    """번역 결과에서 JSON 문자열 배열을 꺼냅니다. 길이가 맞지 않으면 None을 반환합니다."""
+    start, end = output.find('['), output.rfind(']')
+    if start < 0 or end < start:
+        return None
+    try:
+        cells = json.loads(output[start:end + 1])
+    except ValueError:
+        return None
+    if not isinstance(cells, list) or len(cells) != count:
+        return None
+    # 셀 안에서는 줄바꿈과 파이프를 쓸 수 없으므로 한 줄로 정리하고 파이프는 이스케이프
+    return [re.sub(r'\s+', ' ', str(cell)).strip().replace('\\|', '|').replace('|', '\\|') for cell in cells]
+
+def translate_table_cells_with_solar(cells: list, config: dict) -> dict:
+    """
+    중복 없는 표 셀 문구를 JSON 배열로 묶어 Solar Pro2로 번역하고 {원문: 번역}을 반환합니다.
+    보통 언어당 요청 한 번이며, TRANSLATION_BATCH_CHARS를 넘으면 나눠 보냅니다. 끝내 실패한 묶음의 셀은 결과에서 빠집니다.
+    """
+    chain = get_chain("translation_cells")
+    batches, current, current_chars = [], [], 0
+    for cell in cells:
+        if current and current_chars + len(cell) > TRANSLATION_BATCH_CHARS:
+            batches.append(current)
+            current, current_chars = [], 0
+        current.append(cell)
+        current_chars += len(cell)
+    if current:
+        batches.append(current)
+
+    translations = {}
+    for i, batch in enumerate(batches, 1):
+        for attempt in range(TRANSLATION_CHUNK_RETRIES + 1):
+            acquire_llm_rate_slot()
+            try:
+                result = chain.invoke({
+                    "cells": json.dumps(batch, ensure_ascii=False),
+                    "target_language": config["name"],
+                    "style_guide": config["style"],
+                })
+                translated = parse_translated_cells(result, len(batch))
+                if translated is None:
+                    raise ValueError("번역된 셀 배열의 길이가 원문과 맞지 않습니다")
+                translations.update(zip(batch, translated))
+                print(f"   ✅ 표 셀 묶음 {i}/{len(batches)} 번역 완료 ({len(batch)}종)")
+                break
+            except Exception as e:
+                if attempt == TRANSLATION_CHUNK_RETRIES:
+                    print(f"❌ 표 셀 묶음 {i}/{len(batches)} 최종 실패, 원문을 유지합니다: {e}")
                 else:
-                    # 양쪽 파이프 있음 - 첫/마지막 빈 요소 제거
-                    if clean_cells and not clean_cells[0]:
-                        clean_cells = clean_cells[1:]
-                    if clean_cells and not clean_cells[-1]:
-                        clean_cells = clean_cells[:-1]
-                    fixed_line = '| ' + ' | '.join(clean_cells) + ' |'
-                
-                fixed_lines.append(fixed_line)
-                continue
-        else:
-            # 테이블이 아닌 라인
-            if in_table and stripped == '':
-                # 테이블 다음 빈 줄 - 테이블 종료
-                in_table = False
-            
-        # 일반 라인 추가
-        fixed_lines.append(line)
-    
-    return '\n'.join(fixed_lines)
+                    print(f"⚠️ 표 셀 묶음 재시도: {e}")
+    return translations
 
-def fix_heading_structure(text):
-    """헤딩 구조 복원"""
-    # 헤딩 앞에 # 개수 복원
-    text = re.sub(r'^(\s*)(#{1,6})\s*(.+)$', r'\1\2 \3', text, flags=re.MULTILINE)
-    return text
+def normalize_translation_segment(segment: str) -> str:
+    """번역 메모리 키용으로 블록을 정규화합니다 (NFC, 줄 끝 공백 제거)."""
+    segment = unicodedata.normalize("NFC", segment)
+    return '\n'.join(line.rstrip() for line in segment.strip().split('\n'))
 
-def fix_list_structure(text):
-    """리스트 구조 복원"""
-    # 리스트 항목 앞의 - 또는 * 복원
-    text = re.sub(r'^(\s*)[-*]\s*(.+)$', r'\1- \2', text, flags=re.MULTILINE)
-    
-    # 번호 리스트 복원
-    text = re.sub(r'^(\s*)(\d+)\.\s*(.+)$', r'\1\2. \3', text, flags=re.MULTILINE)
-    
-    return text
+def is_translatable_segment(segment: str) -> bool:
+    """한글이 없는 조각(숫자만 있는 표, 영문 항목 등)은 번역하지 않고 그대로 둡니다."""
+    return re.search(r'[가-힣ㄱ-ㅎㅏ-ㅣ]', segment) is not None
 
-def fix_emphasis_structure(text):
-    """강조 구조 복원"""
-    # 볼드 복원
-    text = re.sub(r'\*\*([^*]+)\*\*', r'**\1**', text)
-    
-    # 이탤릭 복원  
-    text = re.sub(r'\*([^*]+)\*', r'*\1*', text)
-    
-    return text
+def translation_memory_key(normalized: str, target_lang: str, prompt: str = "translation_segments") -> str:
+    """
+    (번역 프롬프트, 원문 블록, 대상 언어, 모델) 조합의 번역 메모리 키를 만듭니다.
+    표 셀(translation_cells)은 한 줄로 펴고 |를 이스케이프한 번역을 저장하므로 문단 블록과 키를 나눠 씁니다.
+    """
+    _, model, effort = PROMPT_REGISTRY[prompt]
+    return sha256_of_text(f"{prompt}\n{model}/{effort}\n{target_lang}\n{normalized}")
+
+def lookup_translation_memory(segment: str, target_lang: str, prompt: str = "translation_segments"):
+    """번역 메모리에서 블록의 번역을 찾습니다. 없으면 None을 반환합니다."""
+    normalized = normalize_translation_segment(segment)
+    payload = disk_cache_read_json(TRANSLATION_MEMORY_DIR, translation_memory_key(normalized, target_lang, prompt))
+    if payload and payload.get("source") == normalized:
+        return payload.get("translation")
+    return None
+
+def store_translation_memory(pairs: list, target_lang: str, prompt: str = "translation_segments"):
+    """(원문 블록, 번역) 목록을 번역 메모리에 저장하고 용량을 정리합니다."""
+    if not pairs:
+        return
+    try:
+        for segment, translation in pairs:
+            normalized = normalize_translation_segment(segment)
+            payload = {"lang": target_lang, "source": normalized, "translation": translation}
+            disk_cache_write_bytes(TRANSLATION_MEMORY_DIR, translation_memory_key(normalized, target_lang, prompt), ".json",
+                                   json.dumps(payload, ensure_ascii=False).encode('utf-8'))
+        evicted = evict_disk_cache(TRANSLATION_MEMORY_DIR, TRANSLATION_MEMORY_MAX_BYTES)
+        if evicted:
+            print(f"🧹 번역 메모리 정리: {evicted}개 항목 삭제")
+    except Exception as e:
+        print(f"⚠️ 번역 메모리 저장 실패: {e}")
+
+def parse_translated_segments(output: str, count: int):
+    """[[번호]] 표시로 나뉜 번역 결과를 블록 목록으로 되돌립니다. 블록 수가 맞지 않으면 None을 반환합니다."""
+    parts = TRANSLATION_SEGMENT_MARKER_RE.split(output)
+    if len(parts) == 1:
+        return [output.strip()] if count == 1 and output.strip() else None
+    found = {int(num): body for num, body in zip(parts[1::2], parts[2::2])}
+    if sorted(found) != list(range(1, count + 1)):
+        return None
+    translations = [found[n].strip() for n in range(1, count + 1)]
+    return None if not all(translations) else translations
 
-def validate_table_structure(text):
-    """번역 후 테이블 구조 검증"""
-    lines = text.split('\n')
-    issues = []
-    in_table = False
-    table_line_count = 0
-    
-    for i, line in enumerate(lines, 1):
-        stripped = line.strip()
-        
-        if '|' in stripped and not stripped.startswith('http'):
-            if not in_table:
-                in_table = True
-                table_line_count = 0
-            
-            table_line_count += 1
-            
-            # 테이블 라인 검증
-            if not (stripped.startswith('|') and stripped.endswith('|')):
-                issues.append(f"라인 {i}: 테이블 행이 파이프(|)로 시작하고 끝나지 않음")
-            
-            # 연속된 파이프 검증
-            if '||' in stripped:
-                issues.append(f"라인 {i}: 연속된 파이프(||) 발견 - 빈 셀 처리 필요")
-            
-            # 구분선 검증
-            if re.match(r'^[\|\-\s\:]+$', stripped):
-                cell_count = len([x for x in stripped.split('|') if x.strip() != ''])
-                if cell_count == 0:
-                    issues.append(f"라인 {i}: 테이블 구분선에 셀이 없음")
-        else:
-            if in_table and stripped == '':
-                in_table = False
-                if table_line_count < 2:
-                    issues.append(f"라인 {i-table_line_count}~{i-1}: 테이블이 너무 짧음 (헤더+구분선+내용 필요)")
-                table_line_count = 0
-    
-    return issues
+def translate_segments_with_solar(segments: list, config: dict) -> list:
+    """
+    번역 메모리에 없는 블록들을 Solar Pro2로 번역합니다.
+    블록을 TRANSLATION_BATCH_CHARS 이하 묶음으로 모아 [[번호]] 표시와 함께 보내고, 묶음들은 LLM_EXECUTOR에서 동시에 번역합니다.
+    용어 일관성을 위해 앞 묶음 원문의 끝부분을 문맥으로 넘기며, 표시가 어긋난 묶음은 블록별로 다시 번역합니다.
+    블록 순서대로 번역을 반환하고, 끝내 실패한 블록은 None입니다.
+    """
+    chain = get_chain("translation_segments")
+
+    batches, current, current_chars = [], [], 0
+    for segment in segments:
+        if current and current_chars + len(segment) > TRANSLATION_BATCH_CHARS:
+            batches.append(current)
+            current, current_chars = [], 0
+        current.append(segment)
+        current_chars += len(segment)
+    if current:
+        batches.append(current)
+
+    def invoke_batch(batch, context_before):
+        payload = "\n\n".join(
+            f"[[{n}]]\n{segment}" for n, segment in enumerate(batch, 1)
+        )
+        for attempt in range(TRANSLATION_CHUNK_RETRIES + 1):
+            acquire_llm_rate_slot()
+            try:
+                result = chain.invoke({
+                    "segments": payload,
+                    "context_before": context_before or "(없음)",
+                    "target_language": config["name"],
+                    "style_guide": config["style"],
+                })
+                translations = parse_translated_segments(result, len(batch))
+                if translations is None:
+                    raise ValueError("번역 결과의 블록 표시가 원문과 맞지 않습니다")
+                return translations
+            except Exception as e:
+                if attempt == TRANSLATION_CHUNK_RETRIES:
+                    raise
+                print(f"⚠️ 번역 묶음 재시도: {e}")
+
+    def translate_batch(i, batch, context_before):
+        try:
+            return invoke_batch(batch, context_before)
+        except Exception as e:
+            if len(batch) == 1:
+                raise
+            print(f"⚠️ 번역 묶음 {i}/{len(batches)} 실패, 블록별로 다시 번역합니다: {e}")
+            translations = []
+            for segment in batch:
+                try:
+                    translations.extend(invoke_batch([segment], context_before))
+                except Exception as segment_error:
+                    print(f"❌ 블록 번역 최종 실패, 원문을 유지합니다: {segment_error}")
+                    translations.append(None)
+            return translations
+
+    print(f"🔄 번역 중... (블록 {len(segments)}개, {len(batches)}개 묶음 동시 처리)")
+    futures = [
+        LLM_EXECUTOR.submit(translate_batch, i, batch, "\n\n".join(batches[i - 2])[-TRANSLATION_OVERLAP_CHARS:] if i > 1 else "")
+        for i, batch in enumerate(batches, 1)
+    ]
+    translated = []
+    for i, (batch, future) in enumerate(zip(batches, futures), 1):
+        try:
+            translated.extend(future.result())
+            print(f"   ✅ 번역 묶음 {i}/{len(batches)} 완료")
+        except Exception as e:
+            print(f"❌ 번역 묶음 {i}/{len(batches)} 최종 실패, 원문을 유지합니다: {e}")
+            translated.extend([None] * len(batch))
+    return translated
 
 # 기존 deepl_translate_text 함수는 호환성을 위해 solar_translate_text로 리다이렉트
 def deepl_translate_text(text, target_lang):
     """기존 코드 호환성을 위한 래퍼 함수"""
     return solar_translate_text(text, target_lang)
 
+# 세션별 선제 번역 작업: 세션 ID → {"report", "cancel", "futures": {언어: Future}} (오래된 세션부터 정리)
+PRETRANSLATION_JOBS = OrderedDict()
+_PRETRANSLATION_LOCK = threading.Lock()
+PRETRANSLATE_LOCALE_MAP = {"en": "EN", "ja": "JA", "zh": "ZH", "uk": "UK", "vi": "VI"}
+
+def pretranslation_languages(accept_language: str = "") -> list:
+    """
+    배포 기본 언어와 브라우저 Accept-Language의 첫 번째(우선) 언어에서 선제 번역할 언어 코드를 고릅니다.
+    한국어 브라우저도 보통 en을 후순위로 보내므로 후순위 언어는 보지 않고, 우선 언어가 한국어면 브라우저 언어는 추가하지 않습니다.
+    """
+    languages = [code for code in PRETRANSLATE_LANGUAGES if code in PRETRANSLATE_LOCALE_MAP.values()]
+    if PRETRANSLATE_BROWSER_LOCALE and accept_language:
+        primary = accept_language.split(",")[0].split(";")[0].strip().split("-")[0].lower()
+        code = PRETRANSLATE_LOCALE_MAP.get(primary)
+        if code and code not in languages:
+            languages.append(code)
+    return languages
+
+def cancel_pretranslation(session_id: str):
+    """세션의 선제 번역 작업을 취소합니다. 대기 중인 번역은 실행하지 않고, 진행 중인 번역 결과는 버립니다."""
+    with _PRETRANSLATION_LOCK:
+        job = PRETRANSLATION_JOBS.pop(session_id, None)
+    if job:
+        job["cancel"].set()
+        cancelled = sum(future.cancel() for future in job["futures"].values())
+        print(f"🛑 선제 번역 취소 (대기 중이던 {cancelled}개 언어 제외)")
+
+def run_pretranslation(report_md: str, lang: str, cancel_event: threading.Event):
+    """선제 번역 작업 하나를 실행합니다. 취소되었거나 번역에 실패하면 None을 반환합니다."""
+    if cancel_event.is_set():
+        return None
+    translated = deepl_translate_text(report_md, lang)
+    if cancel_event.is_set() or translated.startswith(("번역 오류", "지원하지 않는 언어")):
+        return None
+    print(f"🌐 선제 번역 완료: {lang}")
+    return translated
+
+def start_pretranslation(session_id: str, report_md: str, languages: list):
+    """완성된 분석 보고서를 백그라운드에서 여러 언어로 미리 번역합니다. 같은 세션의 이전 작업은 취소합니다."""
+    cancel_pretranslation(session_id)
+    if not session_id or not report_md.strip() or not languages or not UPSTAGE_API_KEY:
+        return
+    cancel_event = threading.Event()
+    job = {
+        "report": report_md,
+        "cancel": cancel_event,
+        "futures": {lang: PRETRANSLATE_EXECUTOR.submit(run_pretranslation, report_md, lang, cancel_event) for lang in languages},
+    }
+    with _PRETRANSLATION_LOCK:
+        PRETRANSLATION_JOBS[session_id] = job
+        stale = []
+        while len(PRETRANSLATION_JOBS) > PRETRANSLATE_MAX_SESSIONS:
+            stale.append(PRETRANSLATION_JOBS.popitem(last=False)[1])
+    for old_job in stale:
+        old_job["cancel"].set()
+        for future in old_job["futures"].values():
+            future.cancel()
+    print(f"🌐 선제 번역 시작: {', '.join(languages)}")
+
+def get_pretranslated_text(session_id: str, report_md: str, lang: str):
+    """
+    세션에 같은 보고서의 선제 번역이 있으면 결과를 반환합니다. 이미 번역 중이면 끝날 때까지 기다리고,
+    아직 대기열에 있으면(다른 세션 작업이 앞에 있을 수 있음) 취소하고 None을 반환해 바로 번역하게 합니다.
+    """
+    with _PRETRANSLATION_LOCK:
+        job = PRETRANSLATION_JOBS.get(session_id)
+    if not job or job["report"] != report_md or lang not in job["futures"]:
+        return None
+    future = job["futures"][lang]
+    if not future.done() and not future.running() and future.cancel():
+        return None
+    try:
+        return future.result()
+    except Exception:
+        return None
+
+def translate_report_text(session_id: str, report_md: str, lang: str) -> str:
+    """분석 보고서를 번역합니다. 선제 번역 결과가 있으면 그대로 쓰고, 없으면 바로 번역합니다."""
+    translated = get_pretranslated_text(session_id, report_md, lang)
+    if translated is not None:
+        print(f"⚡ 선제 번역 결과 사용: {lang}")
+        return translated
+    return deepl_translate_text(report_md, lang)
+
 def split_text_for_tts(text, max_bytes=4500):
     if len(text.encode('utf-8')) <= max_bytes:
         return [text]
@@ -2692,116 +4071,301 @@ def wrap_chat_html(answer_html_or_md: str, title="🤖 AI 답변"):
 
 # Gradio용 functions
 def analyze_contract(file, progress=gr.Progress(track_tqdm=True)):
+    """
+    계약서를 분석하며 (보고서 HTML, 추출 텍스트, 마크다운 보고서, HTML 보고서 상태)를 단계별로 내보냅니다. (제너레이터)
+    추출 텍스트와 규칙 기반 안전도 점수를 먼저 보여주고, AI 분석은 문단이 완성될 때마다 보고서에 이어 붙입니다.
+    마크다운/HTML 보고서 상태는 분석이 모두 끝난 뒤에만 채웁니다.
+    """
     if file is None:
-        return "❌ 파일을 업로드해주세요.", "", "", ""
+        yield "❌ 파일을 업로드해주세요.", "", "", ""
+        return
     try:
         progress(0.1, desc="🐢🐢🐢🐢🪄🪄🪄🪄🪄..")
-        text, status = extract_text_from_file(file.name)
-        if not text:
-            return f"❌ 텍스트 추출 실패: {status}", "", "", ""
+        # 페이지가 준비되는 대로 규칙 기반 키워드 검사를 먼저 진행합니다.
+        # 분석 도중 규칙 팩이 교체되어도 한 분석은 같은 버전의 규칙으로 끝까지 채점합니다.
+        rule_pack = get_active_rule_pack()
+        page_texts, keyword_hits, text_offset, extraction_notices = [], None, 0, []
+        try:
+            for page_index, total_pages, page_text in iter_document_pages(file.name, extraction_notices):
+                page_texts.append(page_text)
+                if page_text:
+                    # 일치 위치가 최종 결합 텍스트("\n\n" 구분) 기준이 되도록 오프셋을 누적합니다.
+                    keyword_hits = scan_rule_keywords(page_text, keyword_hits, base_offset=text_offset, rule_pack=rule_pack)
+                    text_offset += len(page_text) + 2
+                progress(0.1 + 0.3 * (page_index + 1) / max(total_pages, 1), desc=f"🐢🐢🐢🐢🪄🪄🪄🪄🪄.. ({page_index + 1}/{total_pages})")
+        except Exception as e:
+            print(f"❌ 텍스트 추출 실패: {e}")
+            yield f"❌ 텍스트 추출 실패: 파일 처리 중 오류가 발생했습니다. 파일이 손상되었거나 지원하지 않는 형식일 수 있습니다.\n(서버 오류: {str(e)})", "", "", ""
+            return
+        text = "\n\n".join(t for t in page_texts if t)
+        if not text.strip():
+            yield "❌ 텍스트 추출 실패: 파일에서 텍스트를 추출할 수 없었습니다. 내용이 비어있거나 인식이 어렵습니다.", "", "", ""
+            return
 
         progress(0.4, desc="🐢🐢🐢🐢🪄🪄🪄🪄🪄...")
-        rule_analysis = perform_rule_based_analysis(text) # <<< 임대인 조회가 포함된 함수 호출
+        file_name = os.path.basename(file.name)
+        rule_analysis = perform_rule_based_analysis(text, keyword_hits=keyword_hits, rule_pack=rule_pack) # <<< 임대인 조회가 포함된 함수 호출
+        rule_analysis["alerts"] = extraction_notices + rule_analysis["alerts"]
+
+        # 규칙 기반 결과와 추출 텍스트를 AI 분석보다 먼저 표시
+        pending_note = "⏳ AI 심층 분석을 진행하고 있습니다..."
+        yield render_report_html(file_name, rule_analysis, {"analysis": pending_note}), text, gr.update(), gr.update()
 
         progress(0.7, desc="🐢🐢🐢🐢🪄🪄🪄🪄🪄.")
-        ai_analysis = perform_ai_analysis(text)
+        analysis_text, shown_blocks = "", 0
+        for analysis_text in stream_ai_analysis(text):
+            # 완성된 문단(빈 줄로 끝난 블록)이 늘어날 때만 다시 그려 미완성 마크다운이 깨져 보이지 않게 합니다.
+            completed = analysis_text.rsplit("\n\n", 1)[0] if "\n\n" in analysis_text else ""
+            blocks = completed.count("\n\n") + 1 if completed else 0
+            if blocks > shown_blocks:
+                shown_blocks = blocks
+                partial = {"analysis": f"{completed}\n\n{pending_note}"}
+                yield render_report_html(file_name, rule_analysis, partial), gr.update(), gr.update(), gr.update()
+        ai_analysis = {"analysis": analysis_text}
 
         progress(0.9, desc="🐢🐢🐢🐢🪄🪄🪄🪄🪄...")
-        md_report = generate_report(os.path.basename(file.name), rule_analysis, ai_analysis)
-        html_report = render_report_html(os.path.basename(file.name), rule_analysis, ai_analysis)
+        md_report = generate_report(file_name, rule_analysis, ai_analysis)
+        html_report = render_report_html(file_name, rule_analysis, ai_analysis)
 
-        return html_report, text, md_report, html_report
+        yield html_report, text, md_report, html_report
     except ConnectionError as e:
         print(f"❌ 네트워크 연결 오류: {e}")
-        return "❌ 네트워크 연결이 불안정합니다. 잠시 후 다시 시도해주세요.", "", "", ""
+        yield "❌ 네트워크 연결이 불안정합니다. 잠시 후 다시 시도해주세요.", "", "", ""
     except TimeoutError as e:
         print(f"❌ 처리 시간 초과: {e}")
-        return "❌ 처리 시간이 초과되었습니다. 파일 크기를 줄이거나 다시 시도해주세요.", "", "", ""
+        yield "❌ 처리 시간이 초과되었습니다. 파일 크기를 줄이거나 다시 시도해주세요.", "", "", ""
     except Exception as e:
         print(f"❌ 분석 중 예외 발생: {e}")
-        return f"❌ 분석 중 오류 발생: {str(e)}", "", "", ""
+        yield f"❌ 분석 중 오류 발생: {str(e)}", "", "", ""
+
+# 상담 답변 의미 캐시: 정규화한 질문 → {"vector", "anchors", "answer", "created", "kb_version", "grounded", "slot"} (LRU 순서 유지)
+# numpy가 있으면 캐시된 질문 벡터를 (ANSWER_CACHE_MAX_ENTRIES, 차원) 행렬의 slot 행에 두고 행렬-벡터 곱 한 번으로 비교합니다.
+ANSWER_CACHE = OrderedDict()
+ANSWER_CACHE_STATS = {"hits": 0, "semantic_hits": 0, "misses": 0, "evictions": 0}
+_ANSWER_CACHE_LOCK = threading.Lock()
+_ANSWER_CACHE_EMBEDDINGS = None
+_ANSWER_CACHE_MATRIX = None
+_ANSWER_CACHE_SLOT_KEYS = [None] * ANSWER_CACHE_MAX_ENTRIES  # 행렬 행 번호 → 캐시 키 (빈 행은 None)
+
+def normalize_question(question: str) -> str:
+    """캐시 비교용 질문 정규화: NFC 정규화, 공백 정리, 끝의 물음표·마침표 제거."""
+    question = unicodedata.normalize('NFC', question or '')
+    question = re.sub(r'\s+', ' ', question).strip()
+    return question.rstrip('?？.!~ ')
+
+def question_anchors(question: str) -> tuple:
+    """
+    임베딩으로는 구분되지 않는 질문의 고정 요소(조문 번호, 법령 이름, 그 밖의 숫자)를 뽑습니다.
+    '제3조 내용은?'과 '제8조 내용은?'처럼 이것만 다른 질문은 유사도가 높아도 서로의 캐시된 답변을 쓰지 않습니다.
+    """
+    question = question or ''
+    articles = tuple(sorted({law_article_key(m.group(1), m.group(2)) for m in LAW_ARTICLE_REF_RE.finditer(question)}))
+    laws = tuple(sorted({name for name in LAW_NAME_RE.findall(question) if name and not name.endswith(NON_LAW_WORDS)}))
+    numbers = tuple(re.findall(r'\d+(?:[.,]\d+)*', question))
+    return articles, laws, numbers
+
+def embed_question(question: str) -> list:
+    """질문을 임베딩하고 단위 벡터로 정규화해 반환합니다. (내적 = 코사인 유사도)"""
+    global _ANSWER_CACHE_EMBEDDINGS
+    if _ANSWER_CACHE_EMBEDDINGS is None:
+        _ANSWER_CACHE_EMBEDDINGS = CachedUpstageEmbeddings(model="solar-embedding-1-large")
+    vector = _ANSWER_CACHE_EMBEDDINGS.embed_query(question)
+    norm = sum(v * v for v in vector) ** 0.5 or 1.0
+    return [v / norm for v in vector]
+
+def _drop_answer_cache_entry(key: str):
+    """캐시 항목을 지우고 행렬 행을 비웁니다. (_ANSWER_CACHE_LOCK을 잡은 상태에서 호출)"""
+    entry = ANSWER_CACHE.pop(key)
+    _ANSWER_CACHE_SLOT_KEYS[entry["slot"]] = None
+    if _ANSWER_CACHE_MATRIX is not None:
+        _ANSWER_CACHE_MATRIX[entry["slot"]] = 0.0
+
+def _write_answer_cache_row(slot: int, vector):
+    """질문 벡터를 행렬의 slot 행에 기록합니다. 차원이 바뀌면 행렬을 새로 만듭니다. (_ANSWER_CACHE_LOCK을 잡은 상태에서 호출)"""
+    global _ANSWER_CACHE_MATRIX
+    if not NUMPY_AVAILABLE:
+        return
+    if _ANSWER_CACHE_MATRIX is None or _ANSWER_CACHE_MATRIX.shape[1] != len(vector):
+        _ANSWER_CACHE_MATRIX = np.zeros((ANSWER_CACHE_MAX_ENTRIES, len(vector)), dtype=np.float32)
+        for entry in ANSWER_CACHE.values():
+            if len(entry["vector"]) == len(vector):
+                _ANSWER_CACHE_MATRIX[entry["slot"]] = entry["vector"]
+    _ANSWER_CACHE_MATRIX[slot] = vector
+
+def invalidate_answer_cache():
+    """상담 답변 캐시를 모두 비웁니다. (지식 베이스 재구축 시 호출)"""
+    with _ANSWER_CACHE_LOCK:
+        if ANSWER_CACHE:
+            print(f"🧹 지식 베이스가 바뀌어 상담 답변 캐시 {len(ANSWER_CACHE)}개를 비웁니다.")
+        for key in list(ANSWER_CACHE):
+            _drop_answer_cache_entry(key)
+
+def lookup_cached_answer(question: str) -> tuple:
+    """
+    캐시된 답변을 찾습니다. 정규화한 질문이 같으면 임베딩 없이 바로, 아니면 조문 번호·법령 이름·숫자(question_anchors)가 같고
+    유사도가 ANSWER_CACHE_SIMILARITY 이상인 가장 비슷한 질문의 답변을 사용합니다.
+    (답변 또는 None, 캐시 키, 질문 벡터 또는 None)을 반환합니다. 질문 벡터는 캐시가 비어 있어도 만들어 두므로,
+    호출하는 쪽은 이 벡터로 검색(retrieve_documents)과 답변 저장을 해 질문을 한 번만 임베딩합니다.
+    """
+    key = normalize_question(question)
+    anchors = question_anchors(key)
+    now = time.time()
+    kb_version = KNOWLEDGE_BASE_STATE["version"]
+
+    # Groundedness Check에서 근거 있음으로 판정된 답변만 재사용 (검사가 끝나지 않은 답변은 아직 쓰지 않음)
+    def is_fresh(entry):
+        return entry["kb_version"] == kb_version and now - entry["created"] < ANSWER_CACHE_TTL_SECONDS and entry["grounded"] is True
+
+    with _ANSWER_CACHE_LOCK:
+        entry = ANSWER_CACHE.get(key)
+        if entry is not None:
+            if is_fresh(entry):
+                ANSWER_CACHE.move_to_end(key)
+                ANSWER_CACHE_STATS["hits"] += 1
+                return entry["answer"], key, entry["vector"]
+            if entry["grounded"] is not None:
+                _drop_answer_cache_entry(key)
+
+    try:
+        vector = embed_question(key)
+    except Exception as e:
+        print(f"⚠️ 질문 임베딩 실패, 답변 캐시를 건너뜁니다: {e}")
+        return None, key, None
+
+    with _ANSWER_CACHE_LOCK:
+        best_key, best_score = None, ANSWER_CACHE_SIMILARITY
+        if ANSWER_CACHE and NUMPY_AVAILABLE and _ANSWER_CACHE_MATRIX is not None and _ANSWER_CACHE_MATRIX.shape[1] == len(vector):
+            scores = _ANSWER_CACHE_MATRIX @ np.asarray(vector, dtype=np.float32)
+            candidates = np.flatnonzero(scores >= ANSWER_CACHE_SIMILARITY)
+            for slot in candidates[np.argsort(-scores[candidates])]:
+                cached_key = _ANSWER_CACHE_SLOT_KEYS[slot]
+                if cached_key is not None and ANSWER_CACHE[cached_key]["anchors"] == anchors and is_fresh(ANSWER_CACHE[cached_key]):
+                    best_key, best_score = cached_key, float(scores[slot])
+                    break
+        elif ANSWER_CACHE:
+            for cached_key, entry in ANSWER_CACHE.items():
+                if entry["anchors"] != anchors or not is_fresh(entry):
+                    continue
+                score = sum(map(mul, vector, entry["vector"]))
+                if score >= best_score:
+                    best_key, best_score = cached_key, score
+        if best_key is None:
+            ANSWER_CACHE_STATS["misses"] += 1
+            return None, key, vector
+        ANSWER_CACHE.move_to_end(best_key)
+        ANSWER_CACHE_STATS["semantic_hits"] += 1
+        print(f"⚡ 유사 질문 캐시 적중: '{best_key}' (유사도 {best_score:.3f})")
+        return ANSWER_CACHE[best_key]["answer"], key, vector
+
+def store_cached_answer(key: str, vector, answer: str):
+    """
+    답변을 캐시에 저장하고, 오래된 항목부터 ANSWER_CACHE_MAX_ENTRIES개까지만 남깁니다.
+    저장된 답변은 mark_cached_answer_groundedness로 근거 있음이 기록된 뒤부터 재사용됩니다.
+    """
+    if vector is None:
+        try:
+            vector = embed_question(key)
+        except Exception as e:
+            print(f"⚠️ 질문 임베딩 실패, 답변을 캐시하지 않습니다: {e}")
+            return
+    with _ANSWER_CACHE_LOCK:
+        if key in ANSWER_CACHE:
+            _drop_answer_cache_entry(key)
+        while len(ANSWER_CACHE) >= ANSWER_CACHE_MAX_ENTRIES:
+            _drop_answer_cache_entry(next(iter(ANSWER_CACHE)))
+            ANSWER_CACHE_STATS["evictions"] += 1
+        slot = _ANSWER_CACHE_SLOT_KEYS.index(None)
+        _ANSWER_CACHE_SLOT_KEYS[slot] = key
+        _write_answer_cache_row(slot, vector)
+        ANSWER_CACHE[key] = {
+            "vector": vector, "anchors": question_anchors(key), "answer": answer, "created": time.time(),
+            "kb_version": KNOWLEDGE_BASE_STATE["version"], "grounded": None, "slot": slot,
+        }
+
+def mark_cached_answer_groundedness(key: str, answer: str, score):
+    """
+    Groundedness Check 결과를 캐시 항목에 기록합니다. 근거 있음으로 판정된 답변만 재사용하며,
+    근거 없음 판정이나 검사 실패(score None), 표본에서 빠져 검사하지 않는 답변(score "unchecked")은 캐시에서 제거합니다.
+    """
+    with _ANSWER_CACHE_LOCK:
+        entry = ANSWER_CACHE.get(key)
+        if entry is None or entry["answer"] != answer:
+            return
+        entry["grounded"] = score is not None and score.lower() == "grounded"
+        if not entry["grounded"]:
+            _drop_answer_cache_entry(key)
+            if score is not None and score != "unchecked":
+                print(f"🧹 근거 부족 판정으로 캐시된 답변을 제거합니다: '{key}'")
 
 def chat_with_ai(message, history):
-    """RAG와 Groundedness Check를 사용하여 법률 상담 채팅을 진행합니다."""
+    """
+    RAG를 사용하여 법률 상담 채팅을 진행합니다. (제너레이터)
+    참고 자료를 먼저 한 번 검색한 뒤 답변을 토큰 단위로 스트리밍하며, 매번 (history, 지금까지의 답변)을 내보냅니다.
+    Groundedness Check는 답변이 끝난 뒤 백그라운드에서 수행합니다.
+    """
     if not message.strip():
-        return history, ""
+        yield history, ""
+        return
     
     # RAG 검색기(RETRIEVER)가 준비되었는지 확인
     if not RETRIEVER:
         err_msg = "⚠️ AI 상담 엔진(RAG)이 초기화되지 않았습니다. 프로그램을 다시 시작하거나 설정을 확인해주세요."
         history.append((message, err_msg))
-        return history, ""
-
-    try:
-        # 1) Groundedness Check 객체 생성
-        groundedness_checker = UpstageGroundednessCheck()
-
-        # 2) 프롬프트 정의
-        prompt = ChatPromptTemplate.from_template(
-            """당신은 한국 부동산 법률 전문가입니다. 주어진 [참고 자료]를 바탕으로 사용자의 [질문]에 대해 친절하고 상세하게 답변해주세요. 답변은 마크다운 형식으로 명확하게 정리해주세요. 법적 효력이 없음을 명시하고 전문가 상담을 권유하는 내용을 포함해주세요. 답변은 곧바로 핵심 내용부터 시작하고, RAG/참고 자료를 언급하는 서문이나 메타 문구(예: '주어진 [참고 자료]와 관련 법률을 바탕으로 답변드립니다')는 절대 포함하지 마세요. 각 핵심 주장마다 관련 [참고 자료]나 조문/문구를 한두 문장으로 간략히 인용하고 따옴표로 표시하세요.
-
-[참고 자료]
-{context}
-
-[질문]
-{question}
-"""
-        )
-
-        # 3) 답변 생성 체인 (출력에 근거 인용 유도)
-        chain = (
-            {
-                "context": RETRIEVER | RunnableLambda(docs_to_text),
-                "question": RunnablePassthrough()
-            }
-            | prompt
-            | ChatUpstage(model="solar-pro2", reasoning_effort="high")
-            | StrOutputParser()
-        )
+        yield history, ""
+        return
 
-        # 4) RAG 답변과 Groundedness Check 병행
-        rag_chain_with_check = RunnablePassthrough.assign(
-            context=itemgetter("question") | RunnableLambda(build_grounded_context_for_question),
-            answer=itemgetter("question") | chain
-        ).assign(
-            groundedness=groundedness_checker
-        )
+    # 같거나 매우 비슷한 질문에 이미 답한 적이 있으면 검색과 생성을 건너뜁니다
+    cached_answer, cache_key, question_vector = lookup_cached_answer(message)
+    if cached_answer is not None:
+        history.append((message, cached_answer))
+        yield history, cached_answer
+        return
 
-        # 5) 실행 및 터미널 출력
-        result_dict = rag_chain_with_check.invoke({"question": message})
-        response = result_dict.get("answer", "")
-        groundedness_result = result_dict.get("groundedness", None)
+    # 질문을 먼저 화면에 표시하고, 답변 칸을 스트리밍으로 채워 나갑니다
+    history.append((message, "⏳ 관련 자료를 찾고 있습니다..."))
+    yield history, ""
 
-        print("\n" + "="*50)
-        print("💬 [실시간 상담] Groundedness Check 결과 (터미널 전용)")
-        if isinstance(groundedness_result, dict):
-            score = groundedness_result.get("binary_score") or groundedness_result.get("score") or groundedness_result.get("result")
-            reason = groundedness_result.get("reason") or groundedness_result.get("explanation")
-        else:
-            score = getattr(groundedness_result, "binary_score", str(groundedness_result))
-            reason = getattr(groundedness_result, "reason", "")
-        print(f" - 사실 기반 점수: {score} ({'근거 있음' if str(score).lower().strip() == 'grounded' else '근거 없음'})")
-        if reason:
-            print(f" - 이유: {reason}")
-        print("="*50 + "\n")
+    try:
 
-        history.append((message, response))
-        return history, response
+        # 1) 참고 자료 검색 (요청당 한 번). 조문 번호를 물으면 해당 조문을 검색 결과 앞에 함께 붙임
+        docs = merge_documents(lookup_law_articles(message), retrieve_documents(message, query_vector=question_vector))
+
+        # 2) 답변 생성 체인 스트리밍 (출력에 근거 인용 유도)
+        chain = get_chain("chat")
+        response = ""
+        for token in chain.stream({"context": docs_to_text(docs), "question": message}):
+            response += token
+            history[-1] = (message, response)
+            yield history, response
+        if not response:
+            history[-1] = (message, response)
+            yield history, response
+
+        # 3) 답변을 캐시에 저장하고, Groundedness Check는 응답과 별도로 백그라운드에서 수행
+        #    (근거 있음으로 판정된 뒤부터 재사용, 표본에서 빠져 검사하지 않는 답변은 캐시하지 않음)
+        if response.strip():
+            store_cached_answer(cache_key, question_vector, response)
+            checked = submit_groundedness_check(
+                "chat", build_grounded_context_for_question(message, docs), response,
+                on_result=lambda score: mark_cached_answer_groundedness(cache_key, response, score)
+            )
+            if not checked:
+                mark_cached_answer_groundedness(cache_key, response, "unchecked")
     except ConnectionError as e:
         print(f"❌ 채팅 네트워크 연결 오류: {e}")
         err_msg = "❌ 네트워크 연결이 불안정합니다. 잠시 후 다시 질문해주세요."
-        history.append((message, err_msg))
-        return history, err_msg
+        history[-1] = (message, err_msg)
+        yield history, err_msg
     except TimeoutError as e:
         print(f"❌ 채팅 응답 시간 초과: {e}")
         err_msg = "❌ 응답 시간이 초과되었습니다. 질문을 간단히 하거나 다시 시도해주세요."
-        history.append((message, err_msg))
-        return history, err_msg
+        history[-1] = (message, err_msg)
+        yield history, err_msg
     except Exception as e:
         print(f"❌ 채팅 중 예외 발생: {e}")
         err_msg = f"❌ 답변 생성 중 오류: {e}"
-        history.append((message, err_msg))
-        return history, err_msg
+        history[-1] = (message, err_msg)
+        yield history, err_msg
 
 # Gradio 인터페이스 
 def create_interface():
@@ -3027,12 +4591,12 @@ def create_interface():
         chat_translated_text = gr.State("")
 
         # 번역 함수 (HTML 포함)
-        def translate_analysis_with_html(report_md, lang):
+        def translate_analysis_with_html(report_md, lang, request: gr.Request):
             if not report_md.strip():
                 return "<div style='padding: 20px; text-align: center; color: #6b7280;'>번역할 분석 결과가 없습니다.</div>", ""
             if lang == "원본":
                 return create_translated_html(report_md, "원본 분석 결과"), report_md
-            translated = deepl_translate_text(report_md, lang)
+            translated = translate_report_text(request.session_hash, report_md, lang)
             lang_names = {"EN": "영어", "JA": "일본어", "ZH": "중국어", "UK": "우크라이나어", "VI": "베트남어"}
             title = f"{lang_names.get(lang, lang)} 번역 결과"
             return create_translated_html(translated, title), translated
@@ -3071,7 +4635,8 @@ def create_interface():
             return html_to_png_downloadable(html, filename_prefix=f"chat_translation_{code}", lang_code_override=(translate_lang if translate_lang != "원본" else "KO"))
 
         # 이벤트 핸들러
-        def clear_all():
+        def clear_all(request: gr.Request):
+            cancel_pretranslation(request.session_hash)
             empty_html = "<div style='display:flex; justify-content:center; align-items:center; height:400px; border: 2px dashed #e5e7eb; border-radius: 20px;'><p style='color:#6b7280;'>📤 파일을 업로드하고 <b>[🔍 분석 시작]</b> 버튼을 클릭하세요.</p></div>"
             empty_translation = "<div style='padding: 20px; text-align: center; color: #6b7280;'>번역할 내용이 없습니다.</div>"
             return (
@@ -3080,20 +4645,32 @@ def create_interface():
                 None, "", "", empty_translation, "", None, None, None, None, None, "", "", gr.update(selected=0)
             )
 
-        def analyze_and_store_report(file, progress=gr.Progress(track_tqdm=True)):
-            html_report, text, md_report, html_pretty = analyze_contract(file, progress)
-            return html_report, text, md_report, html_pretty, gr.update(selected=0)
+        def analyze_and_store_report(file, request: gr.Request, progress=gr.Progress(track_tqdm=True)):
+            cancel_pretranslation(request.session_hash)
+            md_report = ""
+            for html_report, text, md_report, html_pretty in analyze_contract(file, progress):
+                yield html_report, text, md_report, html_pretty, gr.update(selected=0)
+            # 완성된 보고서는 번역 버튼을 누르기 전에 자주 쓰는 언어로 미리 번역해 둡니다
+            if isinstance(md_report, str) and md_report.strip():
+                languages = pretranslation_languages(request.headers.get("accept-language", ""))
+                start_pretranslation(request.session_hash, md_report, languages)
+
+        def cancel_session_pretranslation(request: gr.Request):
+            cancel_pretranslation(request.session_hash)
 
         def store_chat_response(message, history):
-            new_history, last_resp = chat_with_ai(message, history) # chat_with_ai는 이제 RAG 기반
-            # 마지막 답변만 last_chat_response 상태에 저장
+            # chat_with_ai가 내보내는 부분 답변을 그대로 채팅창에 스트리밍
+            new_history = history
+            for new_history, _ in chat_with_ai(message, history):
+                yield new_history, "", gr.update()
+            # 완성된 마지막 답변만 last_chat_response 상태에 저장
             if new_history and len(new_history) > 0:
                 last_resp_text = new_history[-1][1]
             else:
                 last_resp_text = ""
-            return new_history, "", last_resp_text
+            yield new_history, "", last_resp_text
 
-        def generate_analysis_speech(report_md, lang, translate_lang):
+        def generate_analysis_speech(report_md, lang, translate_lang, request: gr.Request):
             if not report_md.strip():
                 return None, "분석 결과가 없습니다."
             
@@ -3103,7 +4680,7 @@ def create_interface():
             if translate_lang != "원본":
                 lang_code_map = {"EN": "EN", "JA": "JA", "ZH": "ZH", "UK": "UK", "VI": "VI"}
                 if lang in lang_code_map:
-                    translated_output = deepl_translate_text(report_md, lang)
+                    translated_output = translate_report_text(request.session_hash, report_md, lang)
                     if "번역 오류" not in translated_output:
                         speech_text_to_use = translated_output
             
@@ -3144,6 +4721,8 @@ def create_interface():
             inputs=[file_input],
             outputs=[analysis_output_html, extracted_text, analysis_report_md, analysis_report_html_state, tabs]
         )
+        # 파일을 다시 올리거나 지우면 이전 보고서의 선제 번역을 취소
+        file_input.change(fn=cancel_session_pretranslation, inputs=None, outputs=None)
         clear_btn.click(
             fn=clear_all,
             outputs=[
@@ -3219,9 +4798,19 @@ def main():
 
     # 3. (백그라운드 작업) RAG 검색기(Retriever) 초기화
     initialize_retriever()
+
+    # 4. 규칙 팩, LLM 체인, 상습 채무불이행자 명단 인덱스 미리 준비 (규칙 팩과 명단은 파일이 바뀌면 자동 갱신)
+    get_active_rule_pack()
+    warm_up_chains()
+    try:
+        get_defaulter_index()
+    except FileNotFoundError:
+        print(f"⚠️ 상습 채무불이행자 명단 파일을 찾을 수 없습니다. ({DEFAULTER_LIST_PATH})")
+    except Exception as e:
+        print(f"⚠️ 상습 채무불이행자 명단 인덱스 로드 실패: {e}")
     
     try:
-        # 4. Gradio 인터페이스 생성 및 실행
+        # 5. Gradio 인터페이스 생성 및 실행
         app = create_interface()
         print("✅ 인터페이스 생성 완료. 웹서버를 시작합니다.")
         
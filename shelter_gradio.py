@@ -14,6 +14,7 @@ import io
 from PIL import Image, ImageDraw, ImageFont
 import textwrap
 from datetime import datetime
+from rule_pack import get_active_rule_pack, scan_rule_keywords
 
 # 선택 의존성 (HTML -> PNG 변환용)
 HTML2IMAGE_AVAILABLE = False
@@ -431,29 +432,24 @@ def extract_text_from_file(file_path: str) -> tuple[str, str]:
 def perform_rule_based_analysis(contract_text: str) -> dict:
     alerts, safety_score = [], 100
     try:
-        categories = {
-            "보증금_반환": {"keywords": ["보증금", "반환", "즉시", "계약종료"], "risk": "CRITICAL"},
-            "권리관계_유지": {"keywords": ["권리관계", "익일", "근저당", "대항력"], "risk": "CRITICAL"},
-            "전세자금대출": {"keywords": ["대출", "불가", "무효", "전세자금"], "risk": "WARNING"},
-            "수선_의무": {"keywords": ["수선", "하자", "파손", "수리"], "risk": "ADVISORY"},
-            "특약사항": {"keywords": ["특약", "기타사항", "추가조건"], "risk": "ADVISORY"}
-        }
-        for cat_name, info in categories.items():
+        # 규칙 팩(rule_pack.py)을 shellter_gradio.py와 공유하고, 이 앱은 팩의 legacy_threshold를 판정 기준으로 사용
+        rule_pack = get_active_rule_pack()
+        keyword_hits = scan_rule_keywords(contract_text, rule_pack=rule_pack)
+        for cat_name, info in rule_pack["categories"].items():
             display_name = cat_name.replace('_', ' ')
-            keyword_count = sum(1 for kw in info['keywords'] if kw in contract_text)
-            keyword_ratio = keyword_count / len(info['keywords'])
-            if keyword_ratio < 0.3:
+            rule_count = len(info['keywords']) + len(info['patterns'])
+            keyword_count = len(keyword_hits.get(cat_name, {}))
+            keyword_ratio = keyword_count / rule_count
+            if keyword_ratio < rule_pack["legacy_threshold"]:
+                safety_score -= rule_pack["penalties"][info['risk']]
                 if info['risk'] == "CRITICAL":
-                    safety_score -= 40
                     alerts.append(f"🚨 [치명적!] {display_name}: 관련 조항이 누락되어 위험할 수 있습니다!")
                 elif info['risk'] == "WARNING":
-                    safety_score -= 20
                     alerts.append(f"⚠️ [위험] {display_name}: 관련 조항이 미비합니다.")
                 else:
-                    safety_score -= 10
                     alerts.append(f"💡 [권장] {display_name}: 관련 조항 추가를 권장합니다.")
             else:
-                alerts.append(f"✅ [{display_name}] 관련 조항이 확인되었습니다. ({keyword_count}/{len(info['keywords'])}개 키워드)")
+                alerts.append(f"✅ [{display_name}] 관련 조항이 확인되었습니다. ({keyword_count}/{rule_count}개 키워드)")
 
         safety_score = max(0, safety_score)
         return {"alerts": alerts, "safety_score": safety_score}